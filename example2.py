@@ -2,10 +2,11 @@ from qtpeewee import (
     QFormulario, QCharEdit, QFormWidget, QDateWithCalendarEdit, QTableShow,
     QResultList, QListShow, QFkComboBox, QResultTable, run, app, QSearchForm,
     QDecimalEdit, QDateTimeWithCalendarEdit, QChoicesComboBox, ChoiceField,
-    QGridForm, QIntEdit, hybrid_property_field, QPreview, BaseModel)
+    QGridForm, QIntEdit, hybrid_property_field, QPreview, BaseModel,
+    FullTextIndex, QuerySpec)
 from peewee import (
     CharField, DateField, ForeignKeyField, fn, FloatField, DoesNotExist,
-    DateTimeField, JOIN, TextField)
+    DateTimeField, JOIN, TextField, Case, Expression, OP)
 from datetime import datetime, timedelta
 
 
@@ -62,6 +63,14 @@ class Tarefa(BaseModel):
             return 'Pendente'
         return 'Concluída'
 
+    @status.expression
+    def status(cls):
+        em_andamento = Apontamento.select().where(
+            (Apontamento.tarefa == cls.id) & (Apontamento.fim.is_null()))
+        return Case(None, [
+            (cls.data_conclusao.is_null(False), 'Concluída'),
+            (fn.EXISTS(em_andamento), 'Em andamento')], 'Pendente')
+
     def __str__(self):
         return str(self.titulo)
 
@@ -77,6 +86,17 @@ class Tarefa(BaseModel):
         except (DoesNotExist, TypeError):
             return 0
 
+    @tempo.expression
+    def tempo(cls):
+        segundos = fn.COALESCE(fn.SUM(
+            (fn.julianday(Apontamento.fim) -
+             fn.julianday(Apontamento.inicio)) * 86400), 0).cast('INTEGER')
+        return Apontamento.select(fn.printf(
+            '%d:%02d:%02d', segundos / 3600,
+            Expression(segundos / 60, OP.MOD, 60),
+            Expression(segundos, OP.MOD, 60))).where(
+            (Apontamento.tarefa == cls.id) & (Apontamento.fim.is_null(False)))
+
     def esta_em_andamento(self):
         try:
             apontamenos = Tarefa.raw(
@@ -88,6 +108,9 @@ class Tarefa(BaseModel):
             return False
 
 
+tarefa_fts = FullTextIndex(Tarefa, Tarefa.titulo, Tarefa.descricao)
+
+
 class Alocacao(BaseModel):
     tarefa = ForeignKeyField(Tarefa)
     recurso = ForeignKeyField(Recurso)
@@ -116,7 +139,8 @@ class FormularioRecurso(QFormulario):
         return {
             'tipo': {
                 'form_new': FormularioTipo,
-                'form_edit': FormularioTipo
+                'form_edit': FormularioTipo,
+                'display_fields': [Tipo.nome]
             }
         }
 
@@ -134,7 +158,8 @@ class FormularioProjeto(QFormulario):
         return {
             'cliente': {
                 'form_new': FormularioCliente,
-                'form_edit': FormularioCliente
+                'form_edit': FormularioCliente,
+                'lazy': True
             }
         }
 
@@ -143,13 +168,16 @@ class FormularioTarefa(QFormulario):
     ENTIDADE = Tarefa
     TITLE = 'Cadastro de Tarefa'
 
-    def meta(self):
-        # self.realizado = QDecimalEdit(column_name='realizado')
+    def fields(self):
+        QFormulario.fields(self)
         self.prioridade.set_valor(1)
+
+    def meta(self):
         return {
             'projeto': {
                 'form_new': FormularioProjeto,
-                'form_edit': FormularioProjeto
+                'form_edit': FormularioProjeto,
+                'display_fields': [Projeto.nome, Cliente.sigla]
             }
         }
 
@@ -162,11 +190,13 @@ class FormularioAlocacao(QGridForm):
         return {
             'tarefa': {
                 'form_new': FormularioTarefa,
-                'form_edit': FormularioTarefa
+                'form_edit': FormularioTarefa,
+                'lazy': True
             },
             'recurso': {
                 'form_new': FormularioRecurso,
                 'form_edit': FormularioRecurso,
+                'display_fields': [Recurso.nome],
                 'x': 1,
                 'y': 0
             },
@@ -278,22 +308,55 @@ class ProjetosListShow(QListShow):
 class TarefasListDialog(QTableShow):
     TITLE = 'Consulta de tarefas'
     FORM = FormularioTarefa
-
-    def order(self):
-        return fn.lower(Tarefa.prioridade)
-
-    def get_all(self):
-        return Tarefa.select().join(
-            Projeto, on=(Projeto.id == Tarefa.projeto)).join(
-            Cliente, on=(Cliente.id == Projeto.cliente))
-
-    def columns(self):
+    EDITABLE = True
+
+    @classmethod
+    def query_spec(cls):
+        return QuerySpec(
+            Tarefa.select().join(
+                Projeto, on=(Projeto.id == Tarefa.projeto)).join(
+                Cliente, on=(Cliente.id == Projeto.cliente)),
+            order=fn.lower(Tarefa.prioridade),
+            columns=[
+                Tarefa.titulo, (Tarefa.data_limite, 'dd/MM/yyyy'),
+                (Tarefa.prioridade, 'name'), Tarefa.realizado,
+                (Tarefa.projeto, 'nome'), Tarefa.status, Tarefa.tempo,
+                (Tarefa.projeto, 'cliente'),
+                (Tarefa.data_conclusao, 'dd/MM/yyyy')
+            ],
+            filters=[{
+                "entity": Tarefa.projeto,
+                "type": QFkComboBox,
+                "operator": "=",
+                "label": "Projeto"
+            }, {
+                "entity": Tarefa.realizado,
+                "type": QIntEdit,
+                "operator": "<",
+                "label": "% Real. <"
+            }, {
+                "entity": Tarefa.titulo,
+                "type": QCharEdit,
+                "operator": "%",
+                "label": "Título"
+            }, {
+                "entity": Tarefa.data_limite,
+                "name": "limite_desde",
+                "type": QDateWithCalendarEdit,
+                "operator": "since",
+                "label": "Limite de"
+            }, {
+                "entity": Tarefa.data_limite,
+                "name": "limite_ate",
+                "type": QDateWithCalendarEdit,
+                "operator": "until",
+                "label": "Limite até"
+            }])
+
+    def footer(self):
         return [
-            Tarefa.titulo, (Tarefa.data_limite, 'dd/MM/yyyy'),
-            (Tarefa.prioridade, 'name'), Tarefa.realizado,
-            (Tarefa.projeto, 'nome'), Tarefa.status, Tarefa.tempo,
-            (Tarefa.projeto, 'cliente'),
-            (Tarefa.data_conclusao, 'dd/MM/yyyy')
+            (Tarefa.titulo, 'count'), (Tarefa.data_limite, 'min'),
+            (Tarefa.realizado, 'sum')
         ]
 
     def actions(self):
@@ -324,19 +387,6 @@ class TarefasListDialog(QTableShow):
         apontamento.save()
         self.update_result_set()
 
-    def filters(self):
-        return [{
-            "entity": Tarefa.projeto,
-            "type": QFkComboBox,
-            "operator": "=",
-            "label": "Projeto"
-        }, {
-            "entity": Tarefa.realizado,
-            "type": QIntEdit,
-            "operator": "<",
-            "label": "% Real. <"
-        }]
-
 
 class AlocacoesListDialog(QTableShow):
     TITLE = 'Consulta de alocações'
@@ -404,6 +454,7 @@ if __name__ == '__main__':
     Cliente.create_table()
     Projeto.create_table()
     Tarefa.create_table()
+    tarefa_fts.create()
     Alocacao.create_table()
     Apontamento.create_table()
 
@@ -1,21 +1,31 @@
+import atexit
+import collections
+import csv
+import datetime
+import itertools
 import json
 import locale
+import os
 import re
 import sys
+import threading
 import hashlib
 
 from PyQt5.QtCore import (
-    Qt, QDate, QRegExp, QDateTime, QFileInfo, QSize)
+    Qt, QDate, QRegExp, QDateTime, QFileInfo, QSize, QAbstractTableModel,
+    QModelIndex, QObject, QRunnable, QThreadPool, QTimer, pyqtSignal,
+    QStringListModel)
 from PyQt5.QtGui import (
     QDoubleValidator, QIntValidator, QRegExpValidator, QPalette,
-    QTextDocumentWriter, QKeySequence)
+    QTextDocumentWriter, QKeySequence, QColor)
 from PyQt5.QtWidgets import (
     QLabel, QLineEdit, QFormLayout, QWidget, QMessageBox, QDateEdit, QDialog,
     QDialogButtonBox, QVBoxLayout, QGroupBox, QListWidget, QListWidgetItem,
     QPushButton, QHBoxLayout, QMainWindow, QAction, QApplication, QComboBox,
     QTableWidget, QTableWidgetItem, QHeaderView, QDateTimeEdit, QGridLayout,
     QFrame, QFileDialog, QTextEdit, QToolBar, QDockWidget, QStackedLayout,
-    QDesktopWidget)
+    QDesktopWidget, QTableView, QListView, QProgressBar, QProgressDialog,
+    QCompleter, QStyledItemDelegate)
 from PyQt5.QtPrintSupport import QPrintDialog, QPrinter, QPrintPreviewDialog
 import peewee
 from playhouse.hybrid import hybrid_property
@@ -31,6 +41,42 @@ def title_label(label):
     return label.title().replace('_', ' ')
 
 
+def iterate_query(query):
+    # Iterates the query without filling peewee's result cache.
+    if not isinstance(query, peewee.BaseQuery):
+        yield from query
+        return
+    cursor = query.execute()
+    try:
+        while True:
+            try:
+                yield cursor.iterate(False)
+            except StopIteration:
+                return
+    finally:
+        # Closing the generator early resets the pending statement.
+        cursor.cursor.close()
+
+
+QT_TO_STRFTIME = {
+    'yyyy': '%Y', 'yy': '%y', 'MM': '%m', 'dd': '%d', 'HH': '%H', 'hh': '%H',
+    'mm': '%M', 'ss': '%S'}
+
+
+def qt_to_strftime(qt_format):
+    # Returns None when the Qt format needs Qt itself (names, AM/PM, quotes).
+    padrao = ''
+    for token in re.finditer(r"([a-zA-Z])\1*|[^a-zA-Z]+", qt_format):
+        token = token.group(0)
+        if token in QT_TO_STRFTIME:
+            padrao += QT_TO_STRFTIME[token]
+        elif token[0] in "dMyhHmszaApPt'" or "'" in token:
+            return None
+        else:
+            padrao += token.replace('%', '%%')
+    return padrao
+
+
 def stretch(widget):
     widget.setMinimumSize(QSize(0, 0))
     widget.setMaximumSize(QSize(16777215, 16777215))
@@ -42,15 +88,51 @@ def stretch_label(widget):
     return stretch(widget)
 
 
+def alias_expression(expr, name):
+    if isinstance(expr, peewee.SelectBase):
+        return expr.alias(name)
+    # Wrapped so peewee keeps the alias on the queried model even
+    # when the expression belongs to a joined one.
+    return peewee.NodeList((expr,)).alias(name)
+
+
 class CalculatedField:
+    null = True
+    max_length = 255
+    field_type = 'VARCHAR'
 
-    def __init__(self, name, value):
+    def __init__(self, name, value, expression=None, model=None):
         self.name = name
+        self.column_name = name
         self.value = value
+        self.expression = expression
+        self.model = model
 
     def __str__(self):
         return str(self.value)
 
+    def asc(self):
+        return peewee.Ordering(sql_expression(self), 'ASC')
+
+    def desc(self):
+        return peewee.Ordering(sql_expression(self), 'DESC')
+
+
+def mesma_coluna(a, b):
+    # Hybrid properties build a new CalculatedField on every access.
+    if isinstance(a, CalculatedField) and isinstance(b, CalculatedField):
+        return a.name == b.name and a.model is b.model
+    return a is b
+
+
+def sql_expression(entity):
+    if isinstance(entity, CalculatedField):
+        if entity.expression is None:
+            raise ImplementationError(
+                "'{0}' has no SQL expression.".format(entity.name))
+        return entity.expression
+    return entity
+
 
 class hybrid_property_field(hybrid_property):
     def __init__(self, fget, fset=None, fdel=None, expr=None):
@@ -58,14 +140,34 @@ class hybrid_property_field(hybrid_property):
         self.fset = fset
         self.fdel = fdel
         self.expr = expr or fget
+        self.has_expression = expr is not None
 
     def __get__(self, instance, instance_type):
+        name = self.fget.__name__
+        expression = None
         if instance is None:
             value = self.expr(instance_type)
+            if self.has_expression:
+                expression = value
+        elif name in instance.__dict__:
+            # Value selected together with the row.
+            value = instance.__dict__[name]
         else:
             value = self.fget(instance)
-        f = CalculatedField(name=self.fget.__name__, value=value)
-        return f
+        return CalculatedField(
+            name=name, value=value, expression=expression,
+            model=instance_type)
+
+    def __set__(self, instance, value):
+        if self.fset is None:
+            instance.__dict__[self.fget.__name__] = value
+        else:
+            self.fset(instance, value)
+
+    def expression(self, expr):
+        self.expr = expr
+        self.has_expression = True
+        return self
 
 
 class ChoiceField(peewee.IntegerField):
@@ -110,6 +212,15 @@ class QDockWidgetN(QDockWidget):
         widget.dock = self
         QDockWidget.setWidget(self, widget)
 
+    def closeEvent(self, event):
+        if isinstance(self.widget(), QListShow):
+            self.widget().cancela_consulta()
+        QDockWidget.closeEvent(self, event)
+        widget = self.widget()
+        if (isinstance(widget, QFormWidget) and widget.reutilizavel and
+                not widget.libera()):
+            app.formPrincipal.remove_dock(self)
+
 
 class QPrincipal(QMainWindow):
     def __init__(self):
@@ -119,6 +230,7 @@ class QPrincipal(QMainWindow):
         self.import_env_vars()
         self.setAttribute(Qt.WA_DeleteOnClose, True)
         locale.setlocale(locale.LC_ALL, self.env('locale'))
+        self.views = []
         self.initUI()
         self.dock_widgets = []
 
@@ -128,16 +240,33 @@ class QPrincipal(QMainWindow):
         self.__env_vars = data
 
     def add_dock(self, name, class_name=None, object=None):
-        dock = QDockWidgetN(name)
-        dock.setWidget(class_name() if class_name is not None else object)
-        dock.setFeatures(
-            QDockWidget.DockWidgetMovable | QDockWidget.DockWidgetClosable)
-        dock.visibilityChanged.connect(self.update_dock_positions)
+        dock = getattr(object, 'dock', None)
+        reaproveitada = dock in self.dock_widgets
+        if reaproveitada:
+            self.dock_widgets.remove(dock)
+            dock.setWindowTitle(name)
+        else:
+            dock = QDockWidgetN(name)
+            dock.setWidget(
+                class_name() if class_name is not None else object)
+            dock.setFeatures(
+                QDockWidget.DockWidgetMovable |
+                QDockWidget.DockWidgetClosable)
+            dock.visibilityChanged.connect(self.update_dock_positions)
         if len(self.dock_widgets) > 0:
             self.tabifyDockWidget(self.dock_widgets[-1], dock)
         else:
             self.addDockWidget(Qt.TopDockWidgetArea, dock)
         self.dock_widgets.append(dock)
+        if reaproveitada:
+            dock.show()
+            dock.raise_()
+
+    def remove_dock(self, dock):
+        if dock in self.dock_widgets:
+            self.dock_widgets.remove(dock)
+        self.removeDockWidget(dock)
+        dock.deleteLater()
 
     def update_dock_positions(self):
         if len(self.dock_widgets) > 0 and not self.dock_widgets[-1].isVisible():
@@ -165,6 +294,9 @@ class QPrincipal(QMainWindow):
         if tip is not None:
             action.setStatusTip(tip)
         text = text.replace('&', '')
+        if isinstance(form_action, type) and issubclass(
+                form_action, QListShow):
+            self.views.append(form_action)
         action.triggered.connect(lambda: self.add_dock(text, class_name=form_action))
         parent.addAction(action)
 
@@ -189,7 +321,10 @@ class QPeeweeApp(QApplication):
         QApplication.__init__(self, argv)
         self.__principal = self.PRINCIPAL_FORM()
         self.__db = db
+        self.__pool = QThreadPool()
+        self.workers = set()
         self.count_field = 0
+        atexit.register(self.encerra_consultas)
         self.setStyleSheet(open("qss/style.qss", "r").read())
 
     def set_title(self, title):
@@ -203,11 +338,110 @@ class QPeeweeApp(QApplication):
     def formPrincipal(self):
         return self.__principal
 
+    @property
+    def pool(self):
+        return self.__pool
+
+    def encerra_consultas(self):
+        for worker in list(self.workers):
+            worker.cancel()
+        self.__pool.waitForDone()
+
 
+# Apps whose background list refreshes should not block form writes can
+# switch the file to WAL with app.db.pragma('journal_mode', 'wal'). The mode
+# is stored in the database file and adds -wal/-shm files next to it.
 app = QPeeweeApp(sys.argv, peewee.SqliteDatabase('app.db'))
 
 
-class BaseModel(peewee.Model):
+class IdentityMap:
+
+    def __init__(self, maxsize=1000):
+        self.maxsize = maxsize
+        self.enabled = False
+        self.__objetos = collections.OrderedDict()
+        self.__lock = threading.RLock()
+
+    def enable(self, maxsize=None):
+        if maxsize is not None:
+            self.maxsize = maxsize
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        self.clear()
+
+    def clear(self):
+        with self.__lock:
+            self.__objetos.clear()
+
+    def __len__(self):
+        return len(self.__objetos)
+
+    def get(self, model, pk):
+        key = (model, pk)
+        with self.__lock:
+            if key not in self.__objetos:
+                return None
+            self.__objetos.move_to_end(key)
+            return self.__objetos[key]
+
+    def add(self, obj):
+        if not self.enabled:
+            return
+        key = (obj.__class__, obj.get_id())
+        with self.__lock:
+            self.__objetos[key] = obj
+            self.__objetos.move_to_end(key)
+            while len(self.__objetos) > self.maxsize:
+                self.__objetos.popitem(last=False)
+
+    def invalidate(self, model, pk):
+        if isinstance(pk, peewee.Model):
+            pk = pk.get_id()
+        with self.__lock:
+            self.__objetos.pop((model, pk), None)
+
+    def get_by_id(self, model, pk):
+        if isinstance(pk, peewee.Model):
+            pk = pk.get_id()
+        if not self.enabled or pk is None:
+            return model.get_by_id(pk)
+        obj = self.get(model, pk)
+        if obj is None:
+            obj = model.get_by_id(pk)
+            self.add(obj)
+        return obj
+
+
+identity_map = IdentityMap()
+
+
+class CachedForeignKeyAccessor(peewee.ForeignKeyAccessor):
+
+    def get_rel_instance(self, instance):
+        value = instance.__data__.get(self.name)
+        if (identity_map.enabled and value is not None and
+                self.name not in instance.__rel__ and
+                self.field.rel_field is self.rel_model._meta.primary_key):
+            instance.__rel__[self.name] = identity_map.get_by_id(
+                self.rel_model, value)
+        return super(CachedForeignKeyAccessor, self).get_rel_instance(
+            instance)
+
+
+class BaseModelBase(peewee.ModelBase):
+
+    def __new__(cls, name, bases, attrs):
+        model = super(BaseModelBase, cls).__new__(cls, name, bases, attrs)
+        for field in model._meta.sorted_fields:
+            if isinstance(field, peewee.ForeignKeyField):
+                setattr(model, field.name, CachedForeignKeyAccessor(
+                    model, field, field.name))
+        return model
+
+
+class BaseModel(peewee.Model, metaclass=BaseModelBase):
     class Meta:
         database = app.db
 
@@ -420,6 +654,7 @@ class BaseEdit:
         self.nx = nx
         self.ny = ny
         self.max_length = max_length
+        self.valor_carregado = None
         if force_null:
             self.is_required = False
         else:
@@ -430,7 +665,8 @@ class BaseEdit:
         self.setStyleSheet("border: 1px solid red; border-radius: 4px")
 
     def retira_destaque(self):
-        self.setStyleSheet(None)
+        if self.styleSheet():
+            self.setStyleSheet(None)
 
     def is_int(self, value):
         try:
@@ -465,13 +701,29 @@ class BaseEdit:
     def set_valor(self, valor):
         raise NotImplementedError
 
+    def limpa(self):
+        self.clear()
+        self.retira_destaque()
+
+    def valor_comparavel(self):
+        valor = self.get_valor()
+        if isinstance(valor, peewee.Model):
+            return valor.get_id()
+        return valor
+
+    def carrega(self):
+        self.valor_carregado = self.valor_comparavel()
+
+    def alterado(self):
+        return self.valor_comparavel() != self.valor_carregado
+
 
 class QCharEdit(QLineEdit, BaseEdit):
     def __init__(self, field, parent=None, *args, **kwargs):
         QLineEdit.__init__(self, parent=parent)
-        BaseEdit.__init__(
-            self, max_length=field.max_length, is_required=not field.null,
-            *args, **kwargs)
+        kwargs.setdefault('max_length', field.max_length)
+        kwargs.setdefault('is_required', not field.null)
+        BaseEdit.__init__(self, *args, **kwargs)
         self.column_name = field.column_name
 
     def set_valor(self, valor):
@@ -501,9 +753,9 @@ class QCharEdit(QLineEdit, BaseEdit):
 class QIntEdit(QLineEdit, BaseEdit):
     def __init__(self, field, parent=None, *args, **kwargs):
         QLineEdit.__init__(self, parent=parent)
-        BaseEdit.__init__(
-            self, is_required=not field.null, field_type=BaseEdit.INTEGER,
-            *args, **kwargs)
+        kwargs.setdefault('is_required', not field.null)
+        kwargs.setdefault('field_type', BaseEdit.INTEGER)
+        BaseEdit.__init__(self, *args, **kwargs)
         self.column_name = field.column_name
         if self.is_required:
             self.setText('0')
@@ -525,66 +777,238 @@ class QIntEdit(QLineEdit, BaseEdit):
         return True
 
 
+OPTION_MODELS = {}
+
+
+class FkOptions(QObject):
+    atualizado = pyqtSignal()
+
+    def __init__(self, key, query):
+        QObject.__init__(self)
+        self.key = key
+        self.query = query
+        self.refs = 0
+        self.values = None
+        self.indices = {}
+
+    def acquire(self):
+        self.refs += 1
+        return self
+
+    def release(self, *args):
+        self.refs -= 1
+        if self.refs <= 0 and OPTION_MODELS.get(self.key) is self:
+            del OPTION_MODELS[self.key]
+
+    def load(self):
+        if self.values is None:
+            self.values = list(self.query.clone())
+            self.indices = {
+                obj.get_id(): i for i, obj in enumerate(self.values)}
+        return self.values
+
+    def refresh(self):
+        self.values = None
+        self.load()
+        self.atualizado.emit()
+
+
+def fk_options(combo):
+    campos = combo.display_fields
+    key = (
+        combo.__class__, combo.entity,
+        None if campos is None else tuple(campos))
+    opcoes = OPTION_MODELS.get(key)
+    if opcoes is None:
+        opcoes = OPTION_MODELS[key] = FkOptions(key, combo.get_all())
+    return opcoes.acquire()
+
+
+def invalidate_options(model):
+    for opcoes in list(OPTION_MODELS.values()):
+        if opcoes.key[1] is model or any(
+                f.model is model for f in opcoes.key[2] or ()):
+            opcoes.refresh()
+
+
 class QFkComboBox(QComboBox, BaseEdit):
+    LAZY = False
+    SEARCH_LIMIT = 20
+    SEARCH_DELAY = 250
+    DISPLAY_FIELDS = None
+
     def __init__(
             self, entity, field, form_new=None, form_edit=None, parent=None,
-            field_type=BaseEdit.INTEGER, *args, **kwargs):
+            field_type=BaseEdit.INTEGER, lazy=None, search_field=None,
+            display_fields=None, *args, **kwargs):
         QComboBox.__init__(self, parent=parent)
-        BaseEdit.__init__(
-            self, is_required=not field.null, field_type=field_type, *args,
-            **kwargs)
+        kwargs.setdefault('is_required', not field.null)
+        BaseEdit.__init__(self, field_type=field_type, *args, **kwargs)
         self.column_name = field.column_name
         self.entity = entity
         self.values = []
+        self.indices = {}
         self.form_new = form_new
         self.form_edit = form_edit
-        self.update_values()
+        self.lazy = self.LAZY if lazy is None else lazy
+        self.search_field = search_field
+        self.display_fields = (
+            self.DISPLAY_FIELDS if display_fields is None else display_fields)
+        if (self.display_fields is None and
+                entity.__str__ is peewee.Model.__str__ and
+                self.__class__.get_value is QFkComboBox.get_value):
+            self.display_fields = ()
+        if self.lazy:
+            self.prepara_pesquisa()
+        else:
+            self.opcoes = fk_options(self)
+            self.destroyed.connect(self.opcoes.release)
+            self.opcoes.atualizado.connect(self.recarrega)
+            self.recarrega()
 
     def get_all(self):
-        return self.entity.select()
+        if self.display_fields is None:
+            return self.entity.select()
+        campos = list(self.display_fields)
+        if self.search_field is not None and not any(
+                f is self.search_field for f in campos):
+            campos.append(self.search_field)
+        query = self.entity.select(self.entity._meta.primary_key, *campos)
+        for model in {f.model for f in campos}:
+            if model is not self.entity:
+                query = query.switch(self.entity).join(model)
+        return query
+
+    def prepara_pesquisa(self):
+        if self.search_field is None:
+            self.search_field = next((
+                f for f in self.entity._meta.sorted_fields
+                if isinstance(f, (peewee.CharField, peewee.TextField))), None)
+        if self.search_field is None:
+            raise ImplementationError(
+                "Lazy QFkComboBox for '{0}' needs a search_field.".format(
+                    self.entity.__name__))
+        self.sugestoes = []
+        self.carregado = False
+        self.setEditable(True)
+        self.setInsertPolicy(QComboBox.NoInsert)
+        self.modelo_sugestoes = QStringListModel(self)
+        completer = QCompleter(self.modelo_sugestoes, self)
+        completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.setCompleter(completer)
+        completer.activated[QModelIndex].connect(self.escolhe)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(
+            lambda: self.pesquisa(self.currentText(), True))
+        self.lineEdit().textEdited.connect(
+            lambda texto: self.timer.start(self.SEARCH_DELAY))
+        self.define_objeto(None)
+
+    def pesquisa(self, texto, exibe=False):
+        query = self.get_all().where(
+            self.search_field.startswith(texto)).order_by(
+            self.search_field).limit(self.SEARCH_LIMIT)
+        self.sugestoes = list(query)
+        self.modelo_sugestoes.setStringList(
+            [self.get_value(obj) for obj in self.sugestoes])
+        self.carregado = True
+        if exibe:
+            self.completer().complete()
+
+    def escolhe(self, index):
+        if 0 <= index.row() < len(self.sugestoes):
+            self.define_objeto(self.sugestoes[index.row()])
+
+    def define_objeto(self, obj):
+        self.clear()
+        self.values = [] if obj is None else [obj]
+        if not self.is_required:
+            self.addItem('')
+        if obj is not None:
+            self.addItem(self.get_value(obj))
+        self.setCurrentIndex(self.count() - 1)
+
+    def showPopup(self):
+        if self.lazy:
+            self.pesquisa('', True)
+        else:
+            QComboBox.showPopup(self)
+
+    def focusInEvent(self, event):
+        QComboBox.focusInEvent(self, event)
+        if self.lazy and not self.carregado:
+            self.pesquisa('')
+
+    def focusOutEvent(self, event):
+        QComboBox.focusOutEvent(self, event)
+        if self.lazy:
+            self.timer.stop()
+            self.setEditText(self.itemText(self.currentIndex()))
 
     def update_values(self):
+        if self.lazy:
+            atual = self.get_valor()
+            self.carregado = False
+            self.set_valor(atual.get_id() if atual is not None else None)
+            return
+        self.opcoes.refresh()
+
+    def recarrega(self):
+        i = self.currentIndex() - (0 if self.is_required else 1)
+        atual = self.values[i] if 0 <= i < len(self.values) else None
         self.clear()
-        self.values = []
+        self.values = self.opcoes.load()
+        self.indices = self.opcoes.indices
         if not self.is_required:
             self.addItem('')
-        for i in self.get_all():
-            self.values.append(i)
-            self.addItem(self.get_value(i))
+        self.addItems([self.get_value(obj) for obj in self.values])
+        if atual is not None:
+            self.set_valor(atual.get_id())
 
     def get_value(self, obj) -> str:
         return str(obj)
 
     def set_valor(self, id):
-        i = 0
-        if not self.is_required:
-            i += 1
-        for obj in self.values:
-            if obj.get_id() == id:
-                self.setCurrentIndex(i)
-            i += 1
+        if self.lazy:
+            obj = id
+            if id is not None and not isinstance(id, peewee.Model):
+                try:
+                    obj = identity_map.get_by_id(self.entity, id)
+                except peewee.DoesNotExist:
+                    obj = None
+            self.define_objeto(obj)
+            return
+        if isinstance(id, peewee.Model):
+            id = id.get_id()
+        i = self.indices.get(id)
+        if i is not None:
+            self.setCurrentIndex(i + (0 if self.is_required else 1))
 
     def get_valor(self):
-        try:
-            i = self.currentIndex() - 1
-            if not self.is_required:
-                i -= 1
-            return self.values[i]
-        except Exception:
-            return None
+        i = self.currentIndex() - (0 if self.is_required else 1)
+        return self.values[i] if 0 <= i < len(self.values) else None
+
+    def limpa(self):
+        if self.lazy:
+            self.define_objeto(None)
+        else:
+            self.setCurrentIndex(0)
+        self.retira_destaque()
 
 
 class QChoicesComboBox(QComboBox, BaseEdit):
     def __init__(self, field, parent=None, *args, **kwargs):
         QComboBox.__init__(self, parent=parent)
-        BaseEdit.__init__(
-            self, is_required=not field.null, field_type=field.field_type,
-            *args, **kwargs)
+        kwargs.setdefault('is_required', not field.null)
+        kwargs.setdefault('field_type', field.field_type)
+        BaseEdit.__init__(self, *args, **kwargs)
         self.column_name = field.column_name
         self.values = field.values
         self.update_values()
 
     def update_values(self):
+        self.indices = {v['id']: i for i, v in enumerate(self.values)}
         self.clear()
         if not self.is_required:
             self.addItem('')
@@ -595,12 +1019,13 @@ class QChoicesComboBox(QComboBox, BaseEdit):
         return str(item['name'])
 
     def set_valor(self, value_id):
-        i = 0
-        for v in self.values:
-            if v['id'] == value_id:
-                self.setCurrentIndex(i)
-                return
-            i += 1
+        i = self.indices.get(value_id)
+        if i is not None:
+            self.setCurrentIndex(i + (0 if self.is_required else 1))
+
+    def limpa(self):
+        self.setCurrentIndex(0)
+        self.retira_destaque()
 
     def get_valor(self):
         try:
@@ -617,9 +1042,8 @@ class QRegExpEdit(QLineEdit, BaseEdit):
             self, regex, is_required=True, column_name=None,
             parent=None, *args, **kwargs):
         QLineEdit.__init__(self, parent=parent)
-        BaseEdit.__init__(
-            self, is_required=is_required, field_type=BaseEdit.CHAR, *args,
-            **kwargs)
+        kwargs.setdefault('field_type', BaseEdit.CHAR)
+        BaseEdit.__init__(self, is_required=is_required, *args, **kwargs)
         self.column_name = column_name
         self.regex = regex
         self.setValidator(QRegExpValidator(regExp=QRegExp(regex)))
@@ -644,9 +1068,8 @@ class QDecimalEdit(QLineEdit, BaseEdit):
             self, decimals=2, is_required=True, column_name=None,
             parent=None, *args, **kwargs):
         QLineEdit.__init__(self, parent=parent)
-        BaseEdit.__init__(
-            self, is_required=is_required, field_type=BaseEdit.DECIMAL, *args,
-            **kwargs)
+        kwargs.setdefault('field_type', BaseEdit.DECIMAL)
+        BaseEdit.__init__(self, is_required=is_required, *args, **kwargs)
         self.column_name = column_name
         self.decimals = decimals
         self.setText('0.00')
@@ -673,9 +1096,9 @@ class QDecimalEdit(QLineEdit, BaseEdit):
 class QDateTimeWithCalendarEdit(QDateTimeEdit, BaseEdit):
     def __init__(self, field, parent=None, *args, **kwargs):
         QDateTimeEdit.__init__(self, parent=parent)
-        BaseEdit.__init__(
-            self, is_required=not field.null, field_type=BaseEdit.DATETIME,
-            *args, **kwargs)
+        kwargs.setdefault('is_required', not field.null)
+        kwargs.setdefault('field_type', BaseEdit.DATETIME)
+        BaseEdit.__init__(self, *args, **kwargs)
         self.column_name = field.column_name
         self.clear()
         self.setCalendarPopup(True)
@@ -732,9 +1155,9 @@ class QDateTimeWithCalendarEdit(QDateTimeEdit, BaseEdit):
 class QDateWithCalendarEdit(QDateEdit, BaseEdit):
     def __init__(self, field, parent=None, *args, **kwargs):
         QDateEdit.__init__(self, parent=parent)
-        BaseEdit.__init__(
-            self, is_required=not field.null, field_type=BaseEdit.DATE, *args,
-            **kwargs)
+        kwargs.setdefault('is_required', not field.null)
+        kwargs.setdefault('field_type', BaseEdit.DATE)
+        BaseEdit.__init__(self, *args, **kwargs)
         self.column_name = field.column_name
         self.clear()
         self.setCalendarPopup(True)
@@ -837,8 +1260,12 @@ FIELD_TO_EDIT = {
     peewee.BooleanField: None,
 }
 
+FORM_SPECS = {}
+
+
 class QFormBase:
     ENTIDADE = None
+    CACHE_SPEC = True
 
     def __init__(self, objeto=None, has_id=True):
         self.fields()
@@ -848,9 +1275,13 @@ class QFormBase:
         self.objeto = objeto
 
     def meta(self):
+        # Evaluated once per class and cached in FORM_SPECS; forms whose
+        # meta depends on the instance must set CACHE_SPEC = False.
         return {}
 
-    def fields(self):
+    def form_spec(self):
+        meta = self.meta()
+        spec = []
         for k, v in self.ENTIDADE.__dict__.items():
             if (isinstance(v, peewee.FieldAccessor) and k != 'id'):
                 field = getattr(self.ENTIDADE, k)
@@ -858,18 +1289,53 @@ class QFormBase:
                 if cls is None:
                     raise NotImplementedError(
                         'Field does not have a corresponding Edit.')
+                kwargs = dict(meta.get(k, {}), field=field)
                 if cls == QFkComboBox:
-                    meta = self.meta()[k] if k in self.meta().keys() else {}
-                    edit = cls(
-                        entity=field.rel_model, field=field, **meta)
-                else:
-                    edit = cls(field=field)
-                setattr(self, k, edit)
+                    kwargs['entity'] = field.rel_model
+                spec.append((k, cls, kwargs))
+        return spec
+
+    def fields(self):
+        if not self.CACHE_SPEC:
+            spec = self.form_spec()
+        else:
+            spec = FORM_SPECS.get(self.__class__)
+            if spec is None:
+                spec = FORM_SPECS[self.__class__] = self.form_spec()
+        for k, cls, kwargs in spec:
+            setattr(self, k, cls(**kwargs))
 
     def __valor_campo(self, campo):
         if self.objeto is not None:
             return self.objeto.__dict__['__data__'].get(campo)
 
+    def editaveis(self):
+        for k, v in list(self.__dict__.items()):
+            if (not isinstance(v, QHiddenEdit) and
+                    isinstance(v, BaseEdit)):
+                yield k, v
+
+    def campos(self):
+        for k, v in self.editaveis():
+            if not k[:1] == '_':
+                yield k, v
+
+    def preenche(self, objeto):
+        self.objeto = objeto
+        for k, v in self.campos():
+            v.limpa()
+            for valor in (self.padroes.get(k), self.__valor_campo(k)):
+                if valor is not None:
+                    v.set_valor(valor)
+        self.marca_carregado()
+
+    def marca_carregado(self):
+        for k, v in self.editaveis():
+            v.carrega()
+
+    def alterados(self):
+        return [k for k, v in self.editaveis() if v.alterado()]
+
     def _constroi(self):
         itens = sorted(
             self.__dict__.items(),
@@ -907,7 +1373,8 @@ class QFormBase:
 
     def novo(self, field):
         formulario = QFormWidget(formulario=field.form_edit)
-        formulario.buttonBox.accepted.connect(field.update_values)
+        if field.lazy:
+            formulario.buttonBox.accepted.connect(field.update_values)
         formulario.show()
         app.formPrincipal.add_dock(
             'Incluir {0}'.format(field.entity.__name__),
@@ -916,7 +1383,8 @@ class QFormBase:
     def edit(self, field):
         formulario = QFormWidget(
             pk=field.get_valor(), formulario=field.form_edit)
-        formulario.buttonBox.accepted.connect(field.update_values)
+        if field.lazy:
+            formulario.buttonBox.accepted.connect(field.update_values)
         formulario.show()
         app.formPrincipal.add_dock(
             'Editar {0}'.format(field.entity.__name__),
@@ -928,8 +1396,10 @@ class QFormBase:
     @classmethod
     def get(cls, objeto=None):
         b = cls()
+        b.padroes = {k: v.get_valor() for k, v in b.campos()}
         b.objeto = objeto
         b._constroi()
+        b.marca_carregado()
         return b
 
 
@@ -984,10 +1454,35 @@ class QFormulario(QFormLayout, QFormBase):
 
 
 class QSearchForm(QGridForm):
+    alterado = pyqtSignal()
+
     def __init__(self, fields: list):
         super(QSearchForm, self).__init__(has_id=False)
         self._filters = []
         self.__fields = fields
+        self.timer = QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.alterado.emit)
+        self.delay = None
+
+    def set_live(self, delay=300):
+        self.delay = delay
+
+    def is_live(self):
+        return self.delay is not None
+
+    def sinal_alteracao(self, field):
+        if isinstance(field, QLineEdit):
+            return field.textChanged
+        if isinstance(field, QComboBox):
+            return field.currentIndexChanged
+        if isinstance(field, QDateTimeEdit):
+            return field.dateTimeChanged
+        return None
+
+    def campo_alterado(self, *args):
+        if self.is_live():
+            self.timer.start(self.delay)
 
     def _constroi(self):
         x = 0
@@ -997,11 +1492,14 @@ class QSearchForm(QGridForm):
             if f["type"] == QFkComboBox:
                 obj_field = f["type"](
                     entity=entity.rel_model, field=entity, force_null=True,
-                    x=x, y=y)
+                    x=x, y=y, **f.get("meta", {}))
             else:
                 obj_field = f["type"](field=entity, force_null=True, x=x, y=y)
-            setattr(self, entity.name, obj_field)
-            f["field"] = getattr(self, entity.name)
+            setattr(self, f.get("name", entity.name), obj_field)
+            f["field"] = obj_field
+            sinal = self.sinal_alteracao(obj_field)
+            if sinal is not None:
+                sinal.connect(self.campo_alterado)
             if "label" in f.keys():
                 label = f["label"]
             else:
@@ -1027,13 +1525,20 @@ class QSearchForm(QGridForm):
         return b
 
 
+FORM_POOL = {}
+
+
 class QFormWidget(QWidget):
+    POOL_SIZE = 4
+    salvo = pyqtSignal(object)
+
     def __init__(self, pk=None, dock=None, formulario=None):
         QWidget.__init__(self)
         self.form = formulario
         self.dock = dock
         self.createFormGroupBox()
         self.pk = pk
+        self.reutilizavel = False
 
         self.buttonBox = QDialogButtonBox(
             QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
@@ -1053,15 +1558,40 @@ class QFormWidget(QWidget):
 
         self.adjustSize()
 
+        self.instancia_formulario = self.form.get(self.busca_objeto())
+        self.setWindowTitle(self.form.TITLE)
+
+    @classmethod
+    def obtem(cls, pk=None, formulario=None):
+        livres = FORM_POOL.get((cls, formulario))
+        if livres:
+            widget = livres.pop()
+            widget.recarrega(pk)
+        else:
+            widget = cls(pk=pk, formulario=formulario)
+        widget.reutilizavel = len(widget.buttons()) == 0
+        return widget
 
+    def busca_objeto(self):
         try:
-            objeto = self.form.ENTIDADE.get_by_id(
-                self.pk
-            )
+            return self.form.ENTIDADE.get_by_id(self.pk)
         except (peewee.DoesNotExist, AttributeError):
-            objeto = None
-        self.instancia_formulario = self.form.get(objeto)
-        self.setWindowTitle(self.form.TITLE)
+            return None
+
+    def recarrega(self, pk):
+        self.pk = pk
+        self.instancia_formulario.preenche(self.busca_objeto())
+
+    def libera(self):
+        try:
+            self.salvo.disconnect()
+        except TypeError:
+            pass
+        livres = FORM_POOL.setdefault((self.__class__, self.form), [])
+        if len(livres) >= self.POOL_SIZE:
+            return False
+        livres.append(self)
+        return True
 
     def add_buttons(self, mainLayout):
         if len(self.buttons()) == 0:
@@ -1120,6 +1650,7 @@ class QFormWidget(QWidget):
         self.before_save()
         if self.is_valid():
             self.salva_dados()
+            self.salvo.emit(self.instancia_formulario.objeto.get_id())
             if self.dock is not None:
                 self.before_out()
                 self.dock.close()
@@ -1131,13 +1662,23 @@ class QFormWidget(QWidget):
 
     def salva_dados(self):
         form = self.instancia_formulario
+        only = None
         if form.objeto is None:
             form.objeto = form.ENTIDADE()
-        for k, v in form.__dict__.items():
-            if (not isinstance(v, QHiddenEdit) and
-                    isinstance(v, BaseEdit)):
-                setattr(form.objeto, k, v.get_valor())
-        form.objeto.save()
+            nomes = [k for k, v in form.editaveis()]
+        else:
+            nomes = form.alterados()
+            campos = form.ENTIDADE._meta.fields
+            only = [campos[k] for k in nomes if k in campos]
+            if len(only) == 0:
+                return False
+        for k in nomes:
+            setattr(form.objeto, k, getattr(form, k).get_valor())
+        form.objeto.save(only=only)
+        identity_map.invalidate(form.ENTIDADE, form.objeto.get_id())
+        invalidate_options(form.ENTIDADE)
+        form.marca_carregado()
+        return True
 
     def createFormGroupBox(self):
         self.formGroupBox = QWidget()
@@ -1147,7 +1688,8 @@ class QFormWidget(QWidget):
         self.formGroupBox.setLayout(layout)
 
     def show(self):
-        self.set_layout_default(self.instancia_formulario)
+        if self.formGroupBox.layout() is None:
+            self.set_layout_default(self.instancia_formulario)
         super(QFormWidget, self).show()
 
 
@@ -1169,79 +1711,760 @@ class MyQListWidgetItem(QListWidgetItem):
         return self.parent.get_value(self.__objeto)
 
 
-class QResultList(QListWidget):
-    def __init__(self, parent=None):
-        QListWidget.__init__(self, parent=parent)
-        self.filtros = []
-        self.update_result_set()
-        self.itemClicked.connect(self.on_click)
-        self.itemDoubleClicked.connect(self.on_double_click)
+ORDER_KEY = '_keyset_key'
+
+
+def split_order(order):
+    if isinstance(order, peewee.Ordering):
+        return order.node, order.direction.upper() == 'DESC'
+    return order, False
+
+
+def order_by_key(query, order):
+    pk = query.model._meta.primary_key
+    expr, desc = split_order(order)
+    if expr is None:
+        return query.order_by(pk)
+    query = query.select_extend(alias_expression(expr, ORDER_KEY))
+    if desc:
+        return query.order_by(peewee.Ordering(expr, 'DESC'), pk.desc())
+    return query.order_by(expr, pk)
+
+
+def sort_key(row):
+    key = getattr(row, ORDER_KEY, None)
+    return (key is not None, key, row.get_id())
+
+
+def posicao_ordenada(rows, row, order):
+    desc = split_order(order)[1]
+    chave = sort_key(row)
+    for i, r in enumerate(rows):
+        if (sort_key(r) < chave) if desc else (sort_key(r) > chave):
+            return i
+    return len(rows)
+
+
+class KeysetPaginator:
+    KEY = ORDER_KEY
+
+    def __init__(self, page_size=100):
+        self.page_size = page_size
+        self.reset()
+
+    def reset(self):
+        self.__cursors = [None]
+        self.__last = None
+        self.has_next = False
+
+    @property
+    def page(self):
+        return len(self.__cursors)
+
+    @property
+    def has_previous(self):
+        return len(self.__cursors) > 1
+
+    def next(self):
+        if self.has_next:
+            self.__cursors.append(self.__last)
+
+    def previous(self):
+        if self.has_previous:
+            self.__cursors.pop()
+
+    def paginate(self, query, order=None):
+        pk = query.model._meta.primary_key
+        expr, desc = split_order(order)
+        query = order_by_key(query, order)
+        cursor = self.__cursors[-1]
+        if cursor is not None:
+            query = query.where(self.after(expr, pk, desc, *cursor))
+        return query.limit(self.page_size + 1)
+
+    def after(self, expr, pk, desc, key, ident):
+        if expr is None:
+            return pk > ident
+        # Built by hand so subqueries, which lack is_null(), work as keys.
+        is_null = peewee.Expression(expr, peewee.OP.IS, None)
+        if key is None:
+            if desc:
+                return is_null & (pk < ident)
+            return (is_null & (pk > ident)) | peewee.Expression(
+                expr, peewee.OP.IS_NOT, None)
+        if desc:
+            return ((peewee.Tuple(expr, pk) < peewee.Tuple(key, ident)) |
+                    is_null)
+        return peewee.Tuple(expr, pk) > peewee.Tuple(key, ident)
+
+    def receive(self, rows):
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if len(rows) > 0:
+            self.__last = (
+                getattr(rows[-1], self.KEY, None), rows[-1].get_id())
+        return rows
+
+
+def prefetch_related(rows, field, attr=None, batch_size=500):
+    pending = {}
+    for row in rows:
+        value = row.__data__.get(field.name)
+        if value is not None and field.name not in row.__rel__:
+            pending.setdefault(value, []).append(row)
+    related = {}
+    by_pk = field.rel_field is field.rel_model._meta.primary_key
+    if by_pk and identity_map.enabled:
+        for value in pending.keys():
+            obj = identity_map.get(field.rel_model, value)
+            if obj is not None:
+                related[value] = obj
+    ids = [value for value in pending.keys() if value not in related]
+    for i in range(0, len(ids), batch_size):
+        query = field.rel_model.select().where(
+            field.rel_field.in_(ids[i:i + batch_size]))
+        for obj in query:
+            related[getattr(obj, field.rel_field.name)] = obj
+            if by_pk:
+                identity_map.add(obj)
+    for value, objs in pending.items():
+        if value in related:
+            for row in objs:
+                row.__rel__[field.name] = related[value]
+    nested = getattr(field.rel_model, attr, None) if attr else None
+    if isinstance(nested, peewee.ForeignKeyField):
+        objs = dict((id(row.__rel__[field.name]), row.__rel__[field.name])
+                    for row in rows if row.__rel__.get(field.name))
+        prefetch_related(list(objs.values()), nested)
+
+
+FULL_TEXT_INDEXES = {}
+
+
+class FullTextIndex:
+    TOKENIZER = 'trigram'
+    MIN_LENGTH = 3
+
+    def __init__(self, model, *fields):
+        pk = model._meta.primary_key
+        if not isinstance(pk, peewee.IntegerField):
+            raise ImplementationError(
+                'Full-text index requires an integer primary key.')
+        self.model = model
+        self.fields = fields
+        self.table_name = '{0}_fts'.format(model._meta.table_name)
+        self.__disponivel = False
+        for field in fields:
+            FULL_TEXT_INDEXES[(model, field.name)] = self
+
+    @property
+    def database(self):
+        return self.model._meta.database
+
+    def exists(self):
+        if not self.__disponivel:
+            self.__disponivel = self.database.table_exists(self.table_name)
+        return self.__disponivel
+
+    def create(self):
+        if self.exists():
+            return
+        tabela = self.model._meta.table_name
+        pk = self.model._meta.primary_key.column_name
+        nomes = [f.column_name for f in self.fields]
+        colunas = ', '.join('"{0}"'.format(c) for c in nomes)
+        novos = ', '.join('new."{0}"'.format(c) for c in nomes)
+        antigos = ', '.join('old."{0}"'.format(c) for c in nomes)
+        inclui = ('INSERT INTO "{0}"(rowid, {1}) '
+                  'VALUES (new."{2}", {3});').format(
+            self.table_name, colunas, pk, novos)
+        exclui = ('INSERT INTO "{0}"("{0}", rowid, {1}) '
+                  'VALUES (\'delete\', old."{2}", {3});').format(
+            self.table_name, colunas, pk, antigos)
+        with self.database.atomic():
+            self.database.execute_sql(
+                'CREATE VIRTUAL TABLE "{0}" USING fts5({1}, content="{2}", '
+                'content_rowid="{3}", tokenize="{4}")'.format(
+                    self.table_name, colunas, tabela, pk, self.TOKENIZER))
+            alteracao = 'UPDATE OF ' + ', '.join(
+                '"{0}"'.format(c) for c in [pk] + nomes)
+            for nome, evento, corpo in (
+                    ('ai', 'INSERT', inclui), ('ad', 'DELETE', exclui),
+                    ('au', alteracao, exclui + ' ' + inclui)):
+                self.database.execute_sql(
+                    'CREATE TRIGGER "{0}_{1}" AFTER {2} ON "{3}" '
+                    'BEGIN {4} END'.format(
+                        self.table_name, nome, evento, tabela, corpo))
+            self.rebuild()
+        self.__disponivel = True
+
+    def drop(self):
+        for nome in ('ai', 'ad', 'au'):
+            self.database.execute_sql(
+                'DROP TRIGGER IF EXISTS "{0}_{1}"'.format(
+                    self.table_name, nome))
+        self.database.execute_sql(
+            'DROP TABLE IF EXISTS "{0}"'.format(self.table_name))
+        self.__disponivel = False
+
+    def rebuild(self):
+        self.database.execute_sql(
+            'INSERT INTO "{0}"("{0}") VALUES (\'rebuild\')'.format(
+                self.table_name))
+
+    def match(self, field, value):
+        termo = '{{{0}}} : "{1}"'.format(
+            field.column_name, str(value).replace('"', '""'))
+        return self.model._meta.primary_key.in_(peewee.SQL(
+            '(SELECT rowid FROM "{0}" WHERE "{0}" MATCH ?)'.format(
+                self.table_name), [termo]))
+
+
+def full_text_match(entity, value):
+    index = FULL_TEXT_INDEXES.get(
+        (getattr(entity, 'model', None), getattr(entity, 'name', None)))
+    if (index is None or len(str(value)) < index.MIN_LENGTH or
+            not index.exists()):
+        return None
+    return index.match(entity, value)
+
+
+def filtro_contem(field, expr, valor):
+    w = full_text_match(field, valor)
+    if w is None:
+        w = peewee.Expression(expr, peewee.OP.ILIKE, '%{0}%'.format(valor))
+    return w
+
+
+def filtro_operador(op):
+    def filtro(field, expr, valor):
+        return peewee.Expression(expr, op, valor)
+    return filtro
+
+
+def sem_caixa(expr):
+    return peewee.NodeList((expr, peewee.SQL('COLLATE NOCASE')))
+
+
+def filtro_prefixo(field, expr, valor):
+    # Case-insensitive for ASCII letters, like '%'; an index declared with
+    # COLLATE NOCASE serves the range.
+    valor = ''.join(c.lower() if c < '\x80' else c for c in str(valor))
+    fim = valor[:-1] + chr(ord(valor[-1]) + 1)
+    expr = sem_caixa(expr)
+    return (peewee.Expression(expr, peewee.OP.GTE, valor) &
+            peewee.Expression(expr, peewee.OP.LT, fim))
+
+
+def filtro_entre(field, expr, valor):
+    inicio, fim = valor
+    if empty(inicio) and empty(fim):
+        return None
+    if empty(fim):
+        return peewee.Expression(expr, peewee.OP.GTE, inicio)
+    if empty(inicio):
+        return peewee.Expression(expr, peewee.OP.LTE, fim)
+    return (peewee.Expression(expr, peewee.OP.GTE, inicio) &
+            peewee.Expression(expr, peewee.OP.LTE, fim))
+
+
+def filtro_lista(field, expr, valor):
+    if isinstance(valor, str):
+        valor = [v.strip() for v in valor.split(',')]
+    valores = [v for v in valor if not empty(v)]
+    if len(valores) == 0:
+        return None
+    return peewee.Expression(expr, peewee.OP.IN, valores)
+
+
+def dia_seguinte(valor):
+    dia = datetime.datetime.strptime(str(valor)[:10], '%Y-%m-%d')
+    return (dia + datetime.timedelta(days=1)).strftime('%Y-%m-%d')
+
+
+def filtro_desde(field, expr, valor):
+    return peewee.Expression(expr, peewee.OP.GTE, str(valor)[:10])
+
+
+def filtro_ate(field, expr, valor):
+    return peewee.Expression(expr, peewee.OP.LT, dia_seguinte(valor))
+
+
+def filtro_dia(field, expr, valor):
+    return filtro_desde(field, expr, valor) & filtro_ate(field, expr, valor)
+
+
+FILTER_OPERATORS = {
+    '%': filtro_contem,
+    '=': filtro_operador(peewee.OP.EQ),
+    '!=': filtro_operador(peewee.OP.NE),
+    '<': filtro_operador(peewee.OP.LT),
+    '<=': filtro_operador(peewee.OP.LTE),
+    '>': filtro_operador(peewee.OP.GT),
+    '>=': filtro_operador(peewee.OP.GTE),
+    'between': filtro_entre,
+    'in': filtro_lista,
+    'startswith': filtro_prefixo,
+    'since': filtro_desde,
+    'until': filtro_ate,
+    'day': filtro_dia,
+}
+
+
+AGGREGATES = {
+    'sum': peewee.fn.SUM,
+    'avg': peewee.fn.AVG,
+    'min': peewee.fn.MIN,
+    'max': peewee.fn.MAX,
+    'count': peewee.fn.COUNT,
+}
+
+
+def compile_filters(filtros):
+    compilados = []
+    for f in filtros:
+        if f["operator"] not in FILTER_OPERATORS:
+            raise ImplementationError(
+                "Unknown filter operator '{0}'.".format(f["operator"]))
+        compilados.append((
+            f, sql_expression(f["entity"]), FILTER_OPERATORS[f["operator"]]))
+    return compilados
+
+
+class BaseFilteredResult:
+    __chave_filtros = None
+    __compilados = ()
+
+    def filtros_compilados(self):
+        chave = [(id(f), id(f["entity"]), f["operator"]) for f in self.filtros]
+        if self.__chave_filtros != chave:
+            self.__compilados = compile_filters(self.filtros)
+            self.__chave_filtros = chave
+        return self.__compilados
+
+    def aplica_filtros(self, query):
+        for f, expr, operador in self.filtros_compilados():
+            valor = f["field"].get_valor() if "field" in f else f["value"]
+            if valor is None or valor == '':
+                continue
+            w = operador(f["entity"], expr, valor)
+            if w is not None:
+                query = query.where(w)
+        return query
+
+
+def banco_em_memoria(database):
+    if not isinstance(database, peewee.SqliteDatabase):
+        return False
+    nome = database.database or ''
+    return (nome in ('', ':memory:') or nome.startswith('file::memory:') or
+            'mode=memory' in nome)
+
+
+class QueryWorkerSignals(QObject):
+    chunk = pyqtSignal(object, object)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(object, object)
+
+
+class QueryWorker(QRunnable):
+    CHUNK_SIZE = 200
+    PROGRESS_STEPS = 1000
+
+    def __init__(self, query, prepare=None):
+        QRunnable.__init__(self)
+        self.query = query
+        self.prepare = prepare
+        self.cancelled = False
+        self.concluido = False
+        self.signals = QueryWorkerSignals()
+
+    @property
+    def database(self):
+        model = getattr(self.query, 'model', None)
+        if not isinstance(self.query, peewee.BaseQuery) or model is None:
+            return None
+        return model._meta.database
+
+    def threaded(self):
+        # Each pool thread opens its own connection, which for an in-memory
+        # SQLite database is a new, empty database.
+        database = self.database
+        return (database is not None and database.thread_safe and
+                not banco_em_memoria(database))
+
+    def start(self):
+        if self.threaded():
+            app.workers.add(self)
+            app.pool.start(self)
+        else:
+            self.run()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def progress(self):
+        return 1 if self.cancelled else 0
+
+    def cursor(self):
+        return iterate_query(self.query)
+
+    def run(self):
+        conexao = None
+        cursor = None
+        try:
+            if self.threaded():
+                conexao = self.database.connection()
+                conexao.set_progress_handler(
+                    self.progress, self.PROGRESS_STEPS)
+            cursor = self.cursor()
+            while not self.cancelled:
+                rows = list(itertools.islice(cursor, self.CHUNK_SIZE))
+                if len(rows) == 0:
+                    self.concluido = True
+                    break
+                if self.prepare is not None:
+                    rows = self.prepare(rows)
+                if not self.cancelled:
+                    self.signals.chunk.emit(self, rows)
+        except Exception as e:
+            if not self.cancelled:
+                self.signals.failed.emit(self, e)
+        finally:
+            if cursor is not None:
+                cursor.close()
+            if conexao is not None:
+                conexao.set_progress_handler(None, 0)
+                self.database.close()
+            self.encerra()
+            self.signals.finished.emit(self)
+            app.workers.discard(self)
+
+    def encerra(self):
+        pass
+
+
+def csv_writer(arquivo, headers):
+    escritor = csv.writer(arquivo)
+    escritor.writerow(headers)
+    return escritor.writerow
+
+
+def jsonl_writer(arquivo, headers):
+    def escreve(textos):
+        arquivo.write(json.dumps(
+            dict(zip(headers, textos)), ensure_ascii=False, default=str))
+        arquivo.write('\n')
+    return escreve
+
+
+EXPORT_FORMATS = {
+    '.csv': csv_writer,
+    '.jsonl': jsonl_writer,
+}
+
+
+class ExportWorkerSignals(QueryWorkerSignals):
+    total = pyqtSignal(int)
+
+
+class ExportWorker(QueryWorker):
+
+    def __init__(self, query, caminho, headers, formatadores, prefetch=None):
+        QueryWorker.__init__(self, query, self.escreve)
+        extensao = os.path.splitext(caminho)[1].lower()
+        if extensao not in EXPORT_FORMATS:
+            raise ImplementationError(
+                "Unknown export format '{0}'.".format(extensao))
+        self.signals = ExportWorkerSignals()
+        self.caminho = caminho
+        self.headers = headers
+        self.formatadores = formatadores
+        self.prefetch = prefetch
+        self.formato = EXPORT_FORMATS[extensao]
+        self.exportados = 0
+        self.arquivo = None
+
+    def start(self):
+        self.arquivo = open(self.caminho, 'w', newline='', encoding='utf-8')
+        self.escreve_linha = self.formato(self.arquivo, self.headers)
+        QueryWorker.start(self)
+
+    def cursor(self):
+        if isinstance(self.query, peewee.BaseQuery):
+            self.signals.total.emit(self.query.order_by().count())
+        else:
+            self.signals.total.emit(len(self.query))
+        return QueryWorker.cursor(self)
+
+    def escreve(self, rows):
+        if self.prefetch is not None:
+            self.prefetch(rows)
+        for item in rows:
+            self.escreve_linha([f(item) for f in self.formatadores])
+        self.exportados += len(rows)
+        return self.exportados
+
+    def encerra(self):
+        self.arquivo.close()
+        if not self.concluido:
+            os.remove(self.caminho)
+
+
+class BaseBackgroundResult:
+    worker = None
+
+    def start_query(self, query, prepare=None):
+        self.cancel_query()
+        self.worker = QueryWorker(query, prepare)
+        self.worker.signals.chunk.connect(self.query_chunk)
+        self.worker.signals.finished.connect(self.query_finished)
+        self.worker.signals.failed.connect(self.query_failed)
+        self.busy.emit(True)
+        self.worker.start()
+
+    def cancel_query(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker = None
+            self.busy.emit(False)
+
+    def is_busy(self):
+        return self.worker is not None
+
+    def query_chunk(self, worker, rows):
+        if worker is self.worker:
+            self.add_rows(rows)
+
+    def query_finished(self, worker):
+        if worker is not self.worker:
+            return
+        self.worker = None
+        if self.paginator() is not None:
+            self.trim_rows(len(self.paginator().receive(self.values)))
+        self.busy.emit(False)
+
+    def query_failed(self, worker, erro):
+        if worker is self.worker:
+            notifica_erro(str(erro), 'Erro na consulta')
+
+
+class BasePagedResult(BaseFilteredResult):
+    __chave_consulta = None
+    __consulta = None
 
     def get_all(self):
         if self.parent() is not None:
             return self.parent().get_all()
         return []
 
+    def consulta_base(self):
+        if not getattr(self.parent(), 'CACHE_QUERY', True):
+            return self.monta_consulta()
+        chave = self.chave_consulta()
+        if self.__consulta is None or self.__chave_consulta != chave:
+            self.__consulta = self.monta_consulta()
+            self.__chave_consulta = chave
+        if isinstance(self.__consulta, peewee.BaseQuery):
+            return self.__consulta.clone()
+        return self.__consulta
+
+    def monta_consulta(self):
+        return self.get_all()
+
+    def chave_consulta(self):
+        return None
+
     def order(self):
         if self.parent() is not None:
             return self.parent().order()
         return None
 
+    def paginator(self):
+        if self.parent() is not None:
+            return self.parent().instancia_paginador
+        return None
+
+    def get_query(self):
+        query = self.get_all_with_filter()
+        if self.paginator() is not None:
+            return self.paginator().paginate(query, self.ordem())
+        if self.ordem() is not None:
+            query = order_by_key(query, self.ordem())
+        return query
+
+    def get_rows(self):
+        rows = self.get_query()
+        if self.paginator() is not None:
+            rows = self.paginator().receive(list(rows))
+        return rows
+
+    def is_busy(self):
+        return False
+
+    def has_more(self):
+        return self.paginator() is not None and self.paginator().has_next
+
+    def atualiza_linha(self, pk):
+        query = self.get_query()
+        if self.is_busy() or not isinstance(query, peewee.BaseQuery):
+            self.update_result_set()
+            return
+        item = query.where(query.model._meta.primary_key == pk).first()
+        rows = self.loaded_rows()
+        atual = next(
+            (i for i, r in enumerate(rows) if r.get_id() == pk), None)
+        selecionado = atual is not None and self.selected() is rows[atual]
+        if atual is not None:
+            self.remove_row(atual)
+        if item is not None:
+            self.prefetch([item])
+            posicao = posicao_ordenada(rows, item, self.ordem())
+            if posicao < len(rows) or not self.has_more():
+                self.insert_row(posicao, item)
+                if selecionado:
+                    self.select_row(posicao)
+        paginador = self.paginator()
+        if paginador is not None:
+            has_next = paginador.has_next
+            if len(rows) > paginador.page_size:
+                self.remove_row(len(rows) - 1)
+                has_next = True
+            paginador.receive(rows)
+            paginador.has_next = has_next
+            self.parent().atualiza_paginacao()
+
+    def on_click(self):
+        pass
+
+    def on_double_click(self):
+        self.abrir_formulario(self.selected().id)
+
+    def abrir_formulario(self, id=None):
+        formulario = QFormWidget.obtem(pk=id, formulario=self.parent().FORM)
+        formulario.salvo.connect(self.atualiza_linha)
+        formulario.show()
+        app.formPrincipal.add_dock(formulario.windowTitle(), object=formulario)
+
+
+class BaseResultList(BasePagedResult):
+
+    def ordem(self):
+        return sql_expression(self.order())
+
     def get_all_with_filter(self):
-        resultlist = self.get_all()
-        if len(self.filtros) > 0:
-            for f in self.filtros:
-                if (f["field"].get_valor() is None or
-                        f["field"].get_valor() == ''):
-                    continue
-                if f["operator"] == "%":
-                    w = (f["entity"].contains(f["field"].get_valor()))
-                elif f["operator"] == "=":
-                    w = (f["entity"] == f["field"].get_valor())
-                elif f["operator"] == "<":
-                    w = (f["entity"] < f["field"].get_valor())
-                resultlist = resultlist.where(w)
-        if self.order() is not None:
-            resultlist = resultlist.order_by(self.order())
+        resultlist = self.aplica_filtros(self.consulta_base())
+        if self.ordem() is not None:
+            resultlist = resultlist.order_by(self.ordem())
         return resultlist
 
-    def update_result_set(self):
-        self.clear()
-        for item in self.get_all_with_filter():
-            self.addItem(MyQListWidgetItem(self, objeto=item))
-
     def get_value(self, obj) -> str:
         if self.parent() is not None:
             return self.parent().get_value(obj)
         return str(obj)
 
+    def value_getter(self):
+        if self.parent() is not None:
+            return self.parent().get_value
+        return self.get_value
+
+    def prefetch(self, rows):
+        self.prefetcher()(rows)
+
+    def prefetcher(self):
+        return lambda rows: None
+
+    def export_columns(self):
+        titulo = self.parent().TITLE if self.parent() is not None else ''
+        return [titulo], [self.value_getter()]
+
+
+class QResultList(QListWidget, BaseBackgroundResult, BaseResultList):
+    busy = pyqtSignal(bool)
+
+    def __init__(self, parent=None):
+        QListWidget.__init__(self, parent=parent)
+        self.filtros = []
+        self.values = []
+        self.update_result_set()
+        self.itemClicked.connect(self.on_click)
+        self.itemDoubleClicked.connect(self.on_double_click)
+
+    def update_result_set(self):
+        self.cancel_query()
+        self.clear()
+        self.values = []
+        prefetch = self.prefetcher()
+        get_value = self.value_getter()
+        self.start_query(
+            self.get_query(),
+            lambda rows: self.build_rows(rows, prefetch, get_value))
+
+    def build_rows(self, rows, prefetch, get_value):
+        prefetch(rows)
+        return [(item, get_value(item)) for item in rows]
+
+    def add_rows(self, rows):
+        for item, txt in rows:
+            self.values.append(item)
+            self.addItem(MyQListWidgetItem(self, text=txt, objeto=item))
+
+    def trim_rows(self, count):
+        del self.values[count:]
+        while self.count() > count:
+            self.takeItem(self.count() - 1)
+
+    def loaded_rows(self):
+        return self.values
+
+    def insert_row(self, row, item):
+        self.values.insert(row, item)
+        # MyQListWidgetItem appends itself to the list on creation.
+        MyQListWidgetItem(self, objeto=item)
+        self.insertItem(row, self.takeItem(self.count() - 1))
+
+    def remove_row(self, row):
+        del self.values[row]
+        self.takeItem(row)
+
+    def select_row(self, row):
+        self.setCurrentRow(row)
+
     def selected(self):
         try:
             return self.selectedItems()[0].getObjeto()
         except Exception:
             return None
 
-    def on_click(self):
-        pass
 
-    def on_double_click(self):
-        self.abrir_formulario(self.selected().id)
+class QuerySpec:
 
-    def abrir_formulario(self, id=None):
-        formulario = QFormWidget(pk=id, formulario=self.parent().FORM)
-        formulario.buttonBox.accepted.connect(self.update_result_set)
-        formulario.show()
-        app.formPrincipal.add_dock(formulario.windowTitle(), object=formulario)
+    def __init__(self, query, order=None, filters=None, columns=None):
+        self.query = query
+        self.order = order
+        self.filters = filters if filters is not None else []
+        self.columns = columns if columns is not None else []
 
 
 class QListShow(QWidget):
     FORM = QFormulario
     LIST = QResultList
     TITLE = 'LIST'
+    # The query from get_all() is built once and reused by every refresh;
+    # views whose get_all() depends on other state set CACHE_QUERY = False.
+    CACHE_QUERY = True
+    PAGE_SIZE = None
+    PAGE_SIZES = [50, 100, 500, 1000]
+    LIVE_FILTER = False
+    FILTER_DELAY = 300
 
     def __init__(self):
         super(QListShow, self).__init__()
         self.instancia_filtro = None
+        self.instancia_paginador = None
+        if self.PAGE_SIZE is not None or self.LIVE_FILTER:
+            self.instancia_paginador = KeysetPaginator(
+                self.PAGE_SIZE or self.PAGE_SIZES[0])
         self.adjustSize()
         self.setWindowTitle(self.TITLE)
         window_layout = QVBoxLayoutWithMargins()
@@ -1256,29 +2479,136 @@ class QListShow(QWidget):
 
         window_layout.addWidget(actions)
         window_layout.addWidget(self.instancia_lista)
+        rodape = self.adiciona_rodape()
+        if rodape is not None:
+            window_layout.addWidget(rodape)
+        window_layout.addWidget(self.adiciona_progresso())
+        if self.instancia_paginador is not None:
+            window_layout.addWidget(self.adiciona_paginacao())
         self.setLayout(window_layout)
         self.showMaximized()
 
+    @classmethod
+    def query_spec(cls):
+        # Declares the view's query without building the widget; the index
+        # advisor only inspects views that return a QuerySpec here.
+        return None
+
     def filters(self):
-        return []
+        spec = self.query_spec()
+        return spec.filters if spec is not None else []
 
     def get_all(self):
-        return []
+        spec = self.query_spec()
+        return spec.query if spec is not None else []
 
     def order(self):
-        return None
+        spec = self.query_spec()
+        return spec.order if spec is not None else None
 
     def get_value(self, obj):
         return 'UNDEFINED'
 
     def filtrar(self):
+        self.instancia_filtro.timer.stop()
         self.instancia_lista.filtros = self.instancia_filtro.filters
+        if self.instancia_paginador is not None:
+            self.instancia_paginador.reset()
+        self.atualiza_lista()
+        self.atualiza_totais()
+
+    def atualiza_lista(self):
         self.instancia_lista.update_result_set()
+        self.atualiza_paginacao()
+
+    def atualiza_totais(self):
+        pass
+
+    def adiciona_rodape(self):
+        return None
+
+    def adiciona_progresso(self):
+        self.barra_progresso = QProgressBar()
+        self.barra_progresso.setRange(0, 0)
+        self.barra_progresso.setTextVisible(False)
+        self.barra_progresso.setMaximumHeight(6)
+        busy = getattr(self.instancia_lista, 'busy', None)
+        if busy is not None:
+            busy.connect(self.atualiza_ocupado)
+        self.barra_progresso.setVisible(self.is_busy())
+        return self.barra_progresso
+
+    def is_busy(self):
+        is_busy = getattr(self.instancia_lista, 'is_busy', None)
+        return is_busy is not None and is_busy()
+
+    def atualiza_ocupado(self, ocupado):
+        self.barra_progresso.setVisible(ocupado)
+        self.atualiza_paginacao()
+
+    def cancela_consulta(self):
+        cancel_query = getattr(self.instancia_lista, 'cancel_query', None)
+        if cancel_query is not None:
+            cancel_query()
+
+    def adiciona_paginacao(self):
+        paginacao = QWidget()
+        layout = QHBoxLayoutWithoutMargins()
+        self.button_anterior = QPushButton(
+            qta.icon('fa.chevron-left', color='black'), '')
+        self.button_anterior.clicked.connect(self.pagina_anterior)
+        layout.addWidget(self.button_anterior)
+        self.label_pagina = QLabel()
+        layout.addWidget(self.label_pagina)
+        self.button_proxima = QPushButton(
+            qta.icon('fa.chevron-right', color='black'), '')
+        self.button_proxima.clicked.connect(self.proxima_pagina)
+        layout.addWidget(self.button_proxima)
+        layout.addStretch()
+        self.combo_tamanho_pagina = QComboBox()
+        page_size = self.instancia_paginador.page_size
+        tamanhos = sorted(set(self.PAGE_SIZES + [page_size]))
+        for tamanho in tamanhos:
+            self.combo_tamanho_pagina.addItem(str(tamanho), tamanho)
+        self.combo_tamanho_pagina.setCurrentIndex(tamanhos.index(page_size))
+        self.combo_tamanho_pagina.currentIndexChanged.connect(
+            self.altera_tamanho_pagina)
+        layout.addWidget(QLabel('Registros por página'))
+        layout.addWidget(self.combo_tamanho_pagina)
+        paginacao.setLayout(layout)
+        self.atualiza_paginacao()
+        return paginacao
+
+    def atualiza_paginacao(self):
+        paginador = self.instancia_paginador
+        if paginador is None:
+            return
+        livre = not self.is_busy()
+        self.label_pagina.setText('Página {0}'.format(paginador.page))
+        self.button_anterior.setEnabled(livre and paginador.has_previous)
+        self.button_proxima.setEnabled(livre and paginador.has_next)
+
+    def pagina_anterior(self):
+        self.instancia_paginador.previous()
+        self.atualiza_lista()
+
+    def proxima_pagina(self):
+        self.instancia_paginador.next()
+        self.atualiza_lista()
+
+    def altera_tamanho_pagina(self, index):
+        self.instancia_paginador.page_size = (
+            self.combo_tamanho_pagina.itemData(index))
+        self.instancia_paginador.reset()
+        self.atualiza_lista()
 
     def adiciona_filtro(self):
         gb = QGroupBox("Filtro")
         self.instancia_filtro = QSearchForm.get(None, self.filters())
         self.instancia_filtro.update_layout_height(2)
+        if self.LIVE_FILTER:
+            self.instancia_filtro.set_live(self.FILTER_DELAY)
+            self.instancia_filtro.alterado.connect(self.filtrar)
         gb.setLayout(self.instancia_filtro)
         gb.setFixedHeight(120)
         f = QFrame(self)
@@ -1302,6 +2632,10 @@ class QListShow(QWidget):
             qta.icon('fa.trash', color='black'), 'E&xcluir')
         button_excluir.clicked.connect(self.excluir)
         actions_layout.addWidget(button_excluir)
+        button_exportar = QPushButton(
+            qta.icon('fa.download', color='black'), 'Ex&portar')
+        button_exportar.clicked.connect(self.exportar)
+        actions_layout.addWidget(button_exportar)
 
         if len(self.instancia_lista.actions()) > 0:
             for a in self.instancia_lista.actions():
@@ -1316,6 +2650,43 @@ class QListShow(QWidget):
     def novo(self, *args, **kwargs):
         self.instancia_lista.abrir_formulario()
 
+    def exportar(self, *args, **kwargs):
+        caminho, filtro = QFileDialog.getSaveFileName(
+            self, 'Exportar', None, 'CSV (*.csv);;JSON Lines (*.jsonl)')
+        if not caminho:
+            return
+        if os.path.splitext(caminho)[1].lower() not in EXPORT_FORMATS:
+            caminho += '.jsonl' if 'jsonl' in filtro else '.csv'
+        self.exporta(caminho)
+
+    def exporta(self, caminho):
+        lista = self.instancia_lista
+        headers, formatadores = lista.export_columns()
+        worker = ExportWorker(
+            lista.get_all_with_filter(), caminho, headers, formatadores,
+            lista.prefetcher())
+        progresso = QProgressDialog('Exportando...', 'Cancelar', 0, 0, self)
+        progresso.setMinimumDuration(0)
+        progresso.canceled.connect(worker.cancel)
+        worker.signals.total.connect(progresso.setMaximum)
+        worker.signals.chunk.connect(
+            lambda worker, exportados: progresso.setValue(exportados))
+        worker.signals.failed.connect(
+            lambda worker, erro: notifica_erro(
+                str(erro), 'Erro na exportação'))
+
+        def termina(*args):
+            progresso.canceled.disconnect(worker.cancel)
+            progresso.close()
+        worker.signals.finished.connect(termina)
+        try:
+            worker.start()
+        except OSError as erro:
+            termina()
+            notifica_erro(str(erro), 'Erro na exportação')
+            return None
+        return worker
+
     def editar(self, *args, **kwargs):
         selecionado = self.instancia_lista.selected()
         if selecionado is not None:
@@ -1333,7 +2704,10 @@ class QListShow(QWidget):
 
             if op == QMessageBox.Yes:
                 sql.execute()
-                self.instancia_lista.update_result_set()
+                identity_map.invalidate(entidade, selecionado.id)
+                invalidate_options(entidade)
+                self.atualiza_lista()
+                self.atualiza_totais()
 
     @property
     def lista(self):
@@ -1344,145 +2718,763 @@ class QListShow(QWidget):
         return self.FORM_FILTER
 
 
-class QResultTable(QTableWidget):
-    FORM = QFormWidget
+Ordenacao = collections.namedtuple(
+    'Ordenacao', ['coluna', 'expressao', 'juncao', 'desc'])
 
-    def __init__(self, parent=None):
-        QTableWidget.__init__(self, parent=parent)
-        self.itemClicked.connect(self.on_click)
-        self.itemDoubleClicked.connect(self.on_double_click)
-        self.values = None
-        self.filtros = []
-        self.update_result_set()
-        self.verticalHeader().hide()
 
-    def get_all(self):
-        return []
+class BaseResultTable(BasePagedResult):
+    FORM = QFormWidget
+    ordenacao = None
+    worker_totais = None
 
-    def get_all_with_filter(self):
+    def monta_consulta(self):
         resultlist = self.get_all()
-        if len(self.filtros) > 0:
-            for f in self.filtros:
-                if (f["field"].get_valor() is None or
-                        f["field"].get_valor() == ''):
-                    continue
-                if f["operator"] == "%":
-                    w = (f["entity"].contains(f["field"].get_valor()))
-                elif f["operator"] == "=":
-                    w = (f["entity"] == f["field"].get_valor())
-                elif f["operator"] == "<":
-                    w = (f["entity"] < f["field"].get_valor())
-                resultlist = resultlist.where(w)
-        if self.order() is not None:
-            resultlist = resultlist.order_by(self.order())
+        calculados = [
+            alias_expression(c.expression, c.name) for c in self.columns()
+            if isinstance(c, CalculatedField) and c.expression is not None]
+        if len(calculados) > 0:
+            resultlist = resultlist.select_extend(*calculados)
+        if self.ordenacao is not None and self.ordenacao.juncao is not None:
+            rel, on = self.ordenacao.juncao
+            resultlist = resultlist.join(
+                rel, peewee.JOIN.LEFT_OUTER, on=on, src=resultlist.model)
         return resultlist
 
-    def get_all(self):
-        if self.parent() is not None:
-            return self.parent().get_all()
-        return []
+    def chave_consulta(self):
+        calculados = tuple(
+            c.name for c in self.columns() if isinstance(c, CalculatedField))
+        coluna = self.ordenacao.coluna if self.ordenacao is not None else None
+        return calculados, coluna
 
-    def order(self):
-        if self.parent() is not None:
-            return self.parent().order()
-        return None
+    def get_all_with_filter(self):
+        resultlist = self.aplica_filtros(self.consulta_base())
+        if self.ordem() is not None:
+            resultlist = resultlist.order_by(self.ordem())
+        return resultlist
+
+    def atualiza_linha(self, pk):
+        self.atualiza_totais()
+        BasePagedResult.atualiza_linha(self, pk)
+
+    def ordem(self):
+        if self.ordenacao is None:
+            return sql_expression(self.order())
+        expr = self.ordenacao.expressao
+        return peewee.Ordering(expr, 'DESC') if self.ordenacao.desc else expr
+
+    def sort_expression(self, column):
+        if isinstance(column, CalculatedField):
+            if column.expression is None:
+                return None
+            return column.expression, None
+        if not isinstance(column, tuple):
+            if isinstance(column, peewee.Field):
+                return column, None
+            return None
+        field, attr = column
+        if isinstance(field, peewee.ForeignKeyField):
+            rel = field.rel_model.alias()
+            expr = getattr(rel, attr, None)
+            if not isinstance(expr, peewee.Field):
+                return None
+            return expr, (rel, field == getattr(rel, field.rel_field.name))
+        if isinstance(field, ChoiceField):
+            return peewee.Case(
+                field, [(v['id'], v[attr]) for v in field.values]), None
+        return field, None
+
+    def ordena_coluna(self, index):
+        header = self.horizontalHeader()
+        ordenavel = self.sort_expression(self.columns()[index])
+        if ordenavel is None:
+            if self.ordenacao is None:
+                header.setSortIndicator(-1, Qt.AscendingOrder)
+            else:
+                header.setSortIndicator(
+                    self.ordenacao.coluna, Qt.DescendingOrder
+                    if self.ordenacao.desc else Qt.AscendingOrder)
+            return
+        desc = (self.ordenacao is not None and
+                self.ordenacao.coluna == index and not self.ordenacao.desc)
+        self.ordenacao = Ordenacao(index, ordenavel[0], ordenavel[1], desc)
+        header.setSortIndicator(
+            index, Qt.DescendingOrder if desc else Qt.AscendingOrder)
+        if self.paginator() is not None:
+            self.paginator().reset()
+            self.parent().atualiza_lista()
+        else:
+            self.update_result_set()
 
     def columns(self):
+        if self.parent() is not None:
+            return self.parent().columns()
         return []
 
-    def set_headers(self):
-        header = self.horizontalHeader()
+    def footer(self):
+        footer = getattr(self.parent(), 'footer', None)
+        return footer() if footer is not None else []
+
+    def footer_columns(self):
+        columns = self.columns()
+        totais = []
+        for column, agregado in self.footer():
+            for i, c in enumerate(columns):
+                if mesma_coluna(
+                        c[0] if isinstance(c, tuple) else c, column):
+                    totais.append((i, c, agregado))
+                    break
+            else:
+                raise ImplementationError(
+                    "Footer column '{0}' is not in columns().".format(
+                        column.name))
+        return totais
+
+    def footer_query(self, totais):
+        query = self.get_all_with_filter()
+        if not isinstance(query, peewee.BaseQuery):
+            return None
+        return query.select(*[
+            AGGREGATES[agregado](sql_expression(
+                c[0] if isinstance(c, tuple) else c)).coerce(False)
+            for i, c, agregado in totais]).order_by().tuples()
+
+    def atualiza_totais(self):
+        if self.worker_totais is not None:
+            self.worker_totais.cancel()
+            self.worker_totais = None
+        totais = self.footer_columns()
+        query = self.footer_query(totais) if len(totais) > 0 else None
+        if query is None:
+            return
+        self.worker_totais = QueryWorker(query)
+        self.worker_totais.signals.chunk.connect(
+            lambda worker, rows: self.recebe_totais(worker, totais, rows[0]))
+        self.worker_totais.signals.failed.connect(
+            lambda worker, erro: notifica_erro(str(erro), 'Erro nos totais'))
+        self.worker_totais.start()
+
+    def recebe_totais(self, worker, totais, valores):
+        if worker is not self.worker_totais:
+            return
+        self.worker_totais = None
+        textos = [''] * len(self.columns())
+        for (i, c, agregado), valor in zip(totais, valores):
+            textos[i] = self.formata_total(c, agregado, valor)
+        self.totais.emit(textos)
+
+    def formata_total(self, column, agregado, valor):
+        if valor is None:
+            return ''
+        field = column[0] if isinstance(column, tuple) else column
+        if agregado in ('min', 'max') and isinstance(field, peewee.Field):
+            item = field.model()
+            item.__data__[field.name] = field.python_value(valor)
+            return self.formatter(column)(item)
+        if isinstance(valor, float):
+            return locale.format_string('%.2f', valor, grouping=True)
+        if isinstance(valor, int):
+            return locale.format_string('%d', valor, grouping=True)
+        return str(valor)
+
+    def header_labels(self):
         labels = []
-        for i, c in enumerate(self.columns()):
+        for c in self.columns():
             label = c[0].name if isinstance(c, tuple) else c.name
             if (isinstance(c, tuple) and
                     isinstance(c[0], peewee.ForeignKeyField)):
                 label = c[1] + ' ' + label
             labels.append(title_label(label))
-            header.setSectionResizeMode(i, QHeaderView.ResizeToContents)
-        self.setHorizontalHeaderLabels(labels)
+        return labels
+
+    def export_columns(self):
+        return self.header_labels(), self.compile_columns(self.columns())
+
+    def prefetch(self, rows):
+        self.prefetcher()(rows)
+
+    def prefetcher(self):
+        relacionados = []
+        for c in self.columns():
+            field = c[0] if isinstance(c, tuple) else c
+            if isinstance(field, peewee.ForeignKeyField):
+                relacionados.append(
+                    (field, c[1] if isinstance(c, tuple) else None))
+
+        def prefetch(rows):
+            for field, attr in relacionados:
+                prefetch_related(rows, field, attr)
+        return prefetch
+
+    def compile_columns(self, columns):
+        return [self.formatter(c) for c in columns]
+
+    def formatter(self, column):
+        if not isinstance(column, tuple):
+            name = column.name
+            if (isinstance(column, peewee.Field) and
+                    not isinstance(column, peewee.ForeignKeyField)):
+                return lambda item: str(item.__data__.get(name))
+            return lambda item: str(getattr(item, name))
+        field, attr = column
+        name = field.name
+        if isinstance(field, peewee.ForeignKeyField):
+            def txt(item):
+                value = getattr(item, name)
+                return str(getattr(value, attr)) if value is not None else ''
+            return txt
+        if isinstance(field, ChoiceField):
+            choices = dict((v['id'], v[attr]) for v in field.values)
+            return lambda item: choices.get(item.__data__.get(name))
+        if isinstance(field, (peewee.DateField, peewee.DateTimeField)):
+            padrao = qt_to_strftime(attr)
+            qt_type = (
+                QDate if isinstance(field, peewee.DateField) else QDateTime)
+
+            def txt(item):
+                value = item.__data__.get(name)
+                if value is None:
+                    return None
+                if padrao is not None:
+                    return value.strftime(padrao)
+                return qt_type(value).toString(attr)
+            return txt
+        return lambda item: getattr(item, name)
 
     def txt_from_tuple(self, item, column_tuple):
-        value = getattr(item, column_tuple[0].name)
-
-        if isinstance(column_tuple[0], peewee.ForeignKeyField):
-            fk_obj = column_tuple[0].rel_model.get_by_id(value)
-            txt = str(getattr(fk_obj, column_tuple[1]))
-        elif isinstance(column_tuple[0], ChoiceField):
-            for v in column_tuple[0].values:
-                if v['id'] == value:
-                    txt = column_tuple[0].values[value][column_tuple[1]]
-        elif (isinstance(column_tuple[0], peewee.DateField)
-                and value is not None):
-            txt = QDate(value).toString(column_tuple[1])
-        elif (isinstance(column_tuple[0], peewee.DateTimeField)
-                and value is not None):
-            import time
-            secs_since_epoch = time.mktime(value.timetuple()) * 1000
-            txt = QDateTime.fromMSecsSinceEpoch(secs_since_epoch).toString(
-                column_tuple[1])
+        return self.formatter(column_tuple)(item)
+
+    def txt_from_column(self, item, column):
+        return self.formatter(column)(item)
+
+    def get_value(self, obj) -> str:
+        return str(obj)
+
+
+class QFieldDelegate(QStyledItemDelegate):
+
+    def createEditor(self, parent, option, index):
+        tabela = self.parent()
+        field = tabela.coluna_editavel(index.row(), index.column())
+        if field is None:
+            return None
+        return tabela.editor(field, parent)
+
+    def setEditorData(self, editor, index):
+        tabela = self.parent()
+        field = tabela.coluna_editavel(index.row(), index.column())
+        valor = tabela.valor_celula(index.row(), field)
+        if valor is None:
+            editor.limpa()
         else:
-            txt = value
-        return txt
+            editor.set_valor(valor)
+        editor.carrega()
+
+    def setModelData(self, editor, model, index):
+        if not editor.alterado():
+            return
+        tabela = self.parent()
+        field = tabela.coluna_editavel(index.row(), index.column())
+        tabela.edita(
+            index.row(), field, editor.get_valor(), editor.is_valid())
+
+
+class QResultTable(QTableWidget, BaseBackgroundResult, BaseResultTable):
+    UPDATE_BATCH = 500
+    COR_ALTERADA = '#fff3cd'
+    COR_INVALIDA = '#f8d7da'
+    busy = pyqtSignal(bool)
+    totais = pyqtSignal(object)
+    pendencias = pyqtSignal(int)
+
+    def __init__(self, parent=None):
+        QTableWidget.__init__(self, parent=parent)
+        self.itemClicked.connect(self.on_click)
+        self.itemDoubleClicked.connect(self.on_double_click)
+        self.values = []
+        self.formatadores = []
+        self.filtros = []
+        self.pendentes = {}
+        self.invalidos = {}
+        self.editavel = getattr(parent, 'EDITABLE', False)
+        if self.editavel:
+            self.setItemDelegate(QFieldDelegate(self))
+        self.horizontalHeader().setSortIndicatorShown(True)
+        self.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.horizontalHeader().sectionClicked.connect(self.ordena_coluna)
+        self.update_result_set()
+        self.verticalHeader().hide()
+
+    def set_headers(self):
+        header = self.horizontalHeader()
+        self.setHorizontalHeaderLabels(self.header_labels())
+        for i in range(self.columnCount()):
+            header.setSectionResizeMode(i, QHeaderView.ResizeToContents)
 
     def update_result_set(self):
-        self.values = self.get_all_with_filter()
+        self.cancel_query()
+        self.values = []
+        columns = self.columns()
+        formatadores = self.compile_columns(columns)
+        self.formatadores = formatadores
         self.clear()
-        self.setColumnCount(len(self.columns()))
-        self.setRowCount(self.values.count())
+        self.setColumnCount(len(columns))
+        self.setRowCount(0)
         self.set_headers()
-        numRows = 0
-        for item in self.values:
-            i = 0
-            for column in self.columns():
-                if isinstance(column, tuple):
-                    txt = self.txt_from_tuple(item, column)
-                else:
-                    txt = str(getattr(item, column.name))
-                self.setItem(numRows, i, QTableWidgetItem(txt))
-                i += 1
-            numRows += 1
-
-    def get_value(self, obj) -> str:
-        return str(obj)
+        prefetch = self.prefetcher()
+        self.start_query(
+            self.get_query(),
+            lambda rows: self.build_rows(rows, prefetch, formatadores))
+
+    def build_rows(self, rows, prefetch, formatadores):
+        prefetch(rows)
+        return [(item, [f(item) for f in formatadores]) for item in rows]
+
+    def add_rows(self, rows):
+        first = len(self.values)
+        self.setRowCount(first + len(rows))
+        for numRow, (item, texts) in enumerate(rows, first):
+            self.values.append(item)
+            for i, txt in enumerate(texts):
+                self.setItem(numRow, i, QTableWidgetItem(txt))
+            if item.get_id() in self.pendentes:
+                self.exibe_linha(numRow)
+
+    def trim_rows(self, count):
+        del self.values[count:]
+        self.setRowCount(count)
+
+    def loaded_rows(self):
+        return self.values
+
+    def insert_row(self, row, item):
+        self.values.insert(row, item)
+        self.insertRow(row)
+        for i, formatador in enumerate(self.formatadores):
+            self.setItem(row, i, QTableWidgetItem(formatador(item)))
+        if item.get_id() in self.pendentes:
+            self.exibe_linha(row)
+
+    def remove_row(self, row):
+        del self.values[row]
+        self.removeRow(row)
+
+    def select_row(self, row):
+        self.setCurrentCell(row, 0)
 
     def selected(self):
-        try:
-            return self.values[self.currentRow()]
-        except Exception:
+        if not 0 <= self.currentRow() < len(self.values):
             return None
-
-    def on_click(self):
-        pass
+        return self.values[self.currentRow()]
 
     def actions(self):
         return []
 
-    def on_double_click(self):
-        self.abrir_formulario(self.selected().id)
+    def on_double_click(self, *args):
+        if self.coluna_editavel(
+                self.currentRow(), self.currentColumn()) is None:
+            BaseResultTable.on_double_click(self)
 
-    def abrir_formulario(self, id=None):
-        formulario = QFormWidget(pk=id,
-                                 formulario=self.parent().FORM)
-        formulario.buttonBox.accepted.connect(
-            self.update_result_set)
-        formulario.show()
-        app.formPrincipal.add_dock(formulario.windowTitle(),
-                                   object=formulario)
+    def coluna_editavel(self, row, index):
+        if (not self.editavel or not 0 <= row < len(self.values) or
+                not 0 <= index < len(self.formatadores)):
+            return None
+        column = self.columns()[index]
+        field = column[0] if isinstance(column, tuple) else column
+        if (not isinstance(field, peewee.Field) or field.primary_key or
+                not isinstance(self.values[row], field.model)):
+            return None
+        cls = FIELD_TO_EDIT.get(field.__class__)
+        if cls is None or not issubclass(cls, BaseEdit):
+            return None
+        return field
+
+    def editor(self, field, parent):
+        cls = FIELD_TO_EDIT[field.__class__]
+        if cls == QFkComboBox:
+            return cls(entity=field.rel_model, field=field, parent=parent)
+        return cls(field=field, parent=parent)
+
+    def valor_celula(self, row, field):
+        item = self.values[row]
+        pendentes = self.pendentes.get(item.get_id(), {})
+        if field.name in pendentes:
+            return pendentes[field.name]
+        return item.__data__.get(field.name)
+
+    def edita(self, row, field, valor, valido):
+        item = self.values[row]
+        pk = item.get_id()
+        if isinstance(valor, peewee.Model):
+            valor = valor.get_id()
+        try:
+            if not empty(valor):
+                valor = field.python_value(valor)
+        except (TypeError, ValueError):
+            valido = False
+        original = item.__data__.get(field.name)
+        pendentes = self.pendentes.setdefault(pk, {})
+        invalidos = self.invalidos.setdefault(pk, set())
+        if valor == original or (empty(valor) and empty(original)):
+            pendentes.pop(field.name, None)
+            invalidos.discard(field.name)
+        else:
+            pendentes[field.name] = valor
+            if valido:
+                invalidos.discard(field.name)
+            else:
+                invalidos.add(field.name)
+        if len(pendentes) == 0:
+            del self.pendentes[pk]
+            del self.invalidos[pk]
+        self.exibe_linha(row)
+        self.pendencias.emit(len(self.pendentes))
+
+    def exibe_linha(self, row):
+        item = self.values[row]
+        pendentes = self.pendentes.get(item.get_id(), {})
+        invalidos = self.invalidos.get(item.get_id(), set())
+        copia = item
+        if len(pendentes) > 0:
+            copia = item.__class__()
+            copia.__data__ = dict(item.__data__)
+            copia.__rel__ = dict(item.__rel__)
+            for nome, valor in pendentes.items():
+                setattr(copia, nome, valor)
+        for i, column in enumerate(self.columns()):
+            celula = self.item(row, i)
+            if celula is None:
+                celula = QTableWidgetItem()
+                self.setItem(row, i, celula)
+            celula.setText(self.formatadores[i](copia))
+            field = column[0] if isinstance(column, tuple) else column
+            nome = getattr(field, 'name', None)
+            if nome in invalidos:
+                celula.setBackground(QColor(self.COR_INVALIDA))
+            elif nome in pendentes:
+                celula.setBackground(QColor(self.COR_ALTERADA))
+            else:
+                celula.setData(Qt.BackgroundRole, None)
+
+    def salva_edicoes(self):
+        if len(self.pendentes) == 0:
+            return True
+        if any(len(nomes) > 0 for nomes in self.invalidos.values()):
+            notifica_erro(
+                text='Corrija os campos destacados antes de salvar',
+                title='Impossível salvar os dados')
+            return False
+        model = self.get_query().model
+        grupos = collections.OrderedDict()
+        for pk, valores in self.pendentes.items():
+            grupos.setdefault(tuple(sorted(valores.items())), []).append(pk)
+        try:
+            with model._meta.database.atomic():
+                for valores, pks in grupos.items():
+                    for lote in peewee.chunked(pks, self.UPDATE_BATCH):
+                        model.update(**dict(valores)).where(
+                            model._meta.primary_key.in_(lote)).execute()
+        except peewee.PeeweeException as e:
+            notifica_erro(text=str(e), title='Erro ao salvar')
+            return False
+        for pk in self.pendentes:
+            identity_map.invalidate(model, pk)
+        invalidate_options(model)
+        self.pendentes = {}
+        self.invalidos = {}
+        self.pendencias.emit(0)
+        if self.parent() is not None:
+            self.parent().atualiza_lista()
+            self.parent().atualiza_totais()
+        else:
+            self.update_result_set()
+        return True
+
+    def descarta_edicoes(self):
+        linhas = [
+            i for i, item in enumerate(self.values)
+            if item.get_id() in self.pendentes]
+        self.pendentes = {}
+        self.invalidos = {}
+        self.pendencias.emit(0)
+        for row in linhas:
+            self.exibe_linha(row)
+
+
+def fecha_cursor(modelo):
+    # A plain function, since destroyed fires after the view's wrapper is gone.
+    def fecha(*args):
+        modelo.close_cursor()
+    return fecha
+
+
+class QResultTableModel(QAbstractTableModel):
+    FETCH_SIZE = 200
+
+    def __init__(self, view):
+        QAbstractTableModel.__init__(self, view)
+        self.view = view
+        self.rows = []
+        self.columns = []
+        self.labels = []
+        self.formatadores = []
+        self.__texts = {}
+        self.__cursor = iterate_query([])
+        self.__exhausted = True
+
+    def update_result_set(self, query):
+        self.beginResetModel()
+        self.close_cursor()
+        self.reset_columns()
+        self.rows = []
+        self.__texts = {}
+        self.__cursor = iterate_query(query)
+        self.__exhausted = False
+        self.endResetModel()
+        self.fetchMore()
+
+    def reset_columns(self):
+        self.columns = self.view.columns()
+        self.labels = self.view.header_labels()
+        self.formatadores = self.view.compile_columns(self.columns)
+
+    def build_texts(self, obj):
+        return [f(obj) for f in self.formatadores]
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.columns)
+
+    def close_cursor(self):
+        self.__cursor.close()
+        self.__exhausted = True
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.__exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        rows = list(itertools.islice(self.__cursor, self.FETCH_SIZE))
+        if len(rows) < self.FETCH_SIZE:
+            self.close_cursor()
+        if len(rows) == 0:
+            return
+        self.view.prefetch(rows)
+        first = len(self.rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self.rows.extend(rows)
+        self.endInsertRows()
+
+    def insert_row(self, row, obj):
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.rows.insert(row, obj)
+        self.__texts = {}
+        self.endInsertRows()
+
+    def remove_row(self, row):
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.rows[row]
+        self.__texts = {}
+        self.endRemoveRows()
+
+    def texts(self, row):
+        if row not in self.__texts:
+            self.__texts[row] = self.build_texts(self.rows[row])
+        return self.__texts[row]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        txt = self.texts(index.row())[index.column()]
+        return str(txt) if txt is not None else ''
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.labels[section]
+        return None
+
+
+class QLazyResultTable(QTableView, BaseResultTable):
+    totais = pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        QTableView.__init__(self, parent=parent)
+        self.filtros = []
+        self.modelo = QResultTableModel(self)
+        self.setModel(self.modelo)
+        self.destroyed.connect(fecha_cursor(self.modelo))
+        self.setSelectionBehavior(QTableView.SelectRows)
+        self.clicked.connect(self.on_click)
+        self.doubleClicked.connect(self.on_double_click)
+        header = self.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.ResizeToContents)
+        header.setResizeContentsPrecision(0)
+        header.setSortIndicatorShown(True)
+        header.setSortIndicator(-1, Qt.AscendingOrder)
+        header.sectionClicked.connect(self.ordena_coluna)
+        self.verticalHeader().hide()
+        self.update_result_set()
+
+    def update_result_set(self):
+        self.modelo.update_result_set(self.get_rows())
+
+    def selected(self):
+        index = self.currentIndex()
+        if not index.isValid():
+            return None
+        return self.modelo.rows[index.row()]
+
+    def has_more(self):
+        return BaseResultTable.has_more(self) or self.modelo.canFetchMore()
+
+    def loaded_rows(self):
+        return self.modelo.rows
+
+    def insert_row(self, row, item):
+        self.modelo.insert_row(row, item)
+
+    def remove_row(self, row):
+        self.modelo.remove_row(row)
+
+    def select_row(self, row):
+        self.setCurrentIndex(self.modelo.index(row, 0))
+
+
+class QResultListModel(QResultTableModel):
+
+    def reset_columns(self):
+        self.columns = [None]
+        self.labels = ['']
+
+    def build_texts(self, obj):
+        return [self.view.get_value(obj)]
+
+
+class QLazyResultList(QListView, BaseResultList):
+    def __init__(self, parent=None):
+        QListView.__init__(self, parent=parent)
+        self.filtros = []
+        self.modelo = QResultListModel(self)
+        self.setModel(self.modelo)
+        self.destroyed.connect(fecha_cursor(self.modelo))
+        self.setUniformItemSizes(True)
+        self.clicked.connect(self.on_click)
+        self.doubleClicked.connect(self.on_double_click)
+        self.update_result_set()
+
+    def update_result_set(self):
+        self.modelo.update_result_set(self.get_rows())
+
+    def selected(self):
+        index = self.currentIndex()
+        if not index.isValid():
+            return None
+        return self.modelo.rows[index.row()]
+
+    def has_more(self):
+        return BaseResultList.has_more(self) or self.modelo.canFetchMore()
+
+    def loaded_rows(self):
+        return self.modelo.rows
+
+    def insert_row(self, row, item):
+        self.modelo.insert_row(row, item)
+
+    def remove_row(self, row):
+        self.modelo.remove_row(row)
+
+    def select_row(self, row):
+        self.setCurrentIndex(self.modelo.index(row, 0))
 
 
 class QTableShow(QListShow):
     LIST = QResultTable
     FORM_FILTER = None
     TITLE = 'TABLE'
+    EDITABLE = False
 
     def __init__(self):
         super(QTableShow, self).__init__()
         self.setWindowTitle(self.TITLE)
 
+    def columns(self):
+        spec = self.query_spec()
+        return spec.columns if spec is not None else []
+
+    def footer(self):
+        return []
+
+    def atualiza_totais(self):
+        if len(self.footer()) > 0:
+            self.instancia_lista.atualiza_totais()
+
+    def adiciona_botoes(self):
+        actions = super(QTableShow, self).adiciona_botoes()
+        if self.EDITABLE:
+            self.button_salvar = QPushButton(
+                qta.icon('fa.save', color='black'), 'Sa&lvar alterações')
+            self.button_salvar.clicked.connect(self.salva_edicoes)
+            actions.layout().addWidget(self.button_salvar)
+            self.instancia_lista.pendencias.connect(self.exibe_pendencias)
+            button_descartar = QPushButton(
+                qta.icon('fa.undo', color='black'), '&Descartar')
+            button_descartar.clicked.connect(self.descarta_edicoes)
+            actions.layout().addWidget(button_descartar)
+        return actions
+
+    def exibe_pendencias(self, quantidade):
+        texto = 'Sa&lvar alterações'
+        if quantidade > 0:
+            texto += ' (%d)' % quantidade
+        self.button_salvar.setText(texto)
+
+    def salva_edicoes(self, *args, **kwargs):
+        return self.instancia_lista.salva_edicoes()
+
+    def descarta_edicoes(self, *args, **kwargs):
+        self.instancia_lista.descarta_edicoes()
+
+    def adiciona_rodape(self):
+        if len(self.footer()) == 0:
+            return None
+        lista = self.instancia_lista
+        self.rodape = QTableWidget(1, len(self.columns()))
+        self.rodape.horizontalHeader().hide()
+        self.rodape.verticalHeader().hide()
+        self.rodape.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.rodape.setFocusPolicy(Qt.NoFocus)
+        self.rodape.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.rodape.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.rodape.setFixedHeight(
+            self.rodape.rowHeight(0) + 2 * self.rodape.frameWidth())
+        lista.horizontalHeader().sectionResized.connect(
+            lambda i, anterior, largura: self.rodape.setColumnWidth(
+                i, largura))
+        lista.horizontalScrollBar().valueChanged.connect(
+            self.rodape.horizontalScrollBar().setValue)
+        lista.totais.connect(self.exibe_totais)
+        lista.atualiza_totais()
+        return self.rodape
+
+    def exibe_totais(self, textos):
+        lista = self.instancia_lista
+        self.rodape.setColumnCount(len(textos))
+        for i, texto in enumerate(textos):
+            item = QTableWidgetItem(texto)
+            fonte = item.font()
+            fonte.setBold(True)
+            item.setFont(fonte)
+            self.rodape.setItem(0, i, item)
+            self.rodape.setColumnWidth(i, lista.columnWidth(i))
+
     def keyPressEvent(self, event):
         if event.key() == Qt.Key_F5:
-            self.instancia_lista.update_result_set()
+            self.atualiza_lista()
+            self.atualiza_totais()
         else:
             super(QTableShow, self).keyPressEvent(event)
 
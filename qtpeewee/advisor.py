@@ -0,0 +1,255 @@
+import argparse
+import importlib
+import inspect
+import re
+import sys
+from collections import namedtuple
+
+import peewee
+
+from qtpeewee import (
+    app, QListShow, BaseResultList, BaseResultTable, KeysetPaginator,
+    split_order, sem_caixa)
+
+
+Advice = namedtuple(
+    'Advice', ['view', 'label', 'kind', 'detail', 'model', 'index', 'hint'])
+
+FULL_SCAN = 'full scan'
+TEMP_BTREE = 'temp b-tree'
+
+SCAN = re.compile(
+    r'^SCAN (TABLE )?\S+( AS \S+)?( USING (COVERING )?INDEX \S+)?$')
+
+SAMPLE_VALUES = {
+    '%': 'abc',
+    'in': [1],
+    'between': (1, 2),
+    'startswith': 'a',
+    'since': '2000-01-01',
+    'until': '2000-01-01',
+    'day': '2000-01-01',
+}
+
+
+def sample_value(filtro):
+    if filtro["operator"] in SAMPLE_VALUES:
+        return SAMPLE_VALUES[filtro["operator"]]
+    if isinstance(filtro["entity"], (peewee.CharField, peewee.TextField)):
+        return 'a'
+    return 1
+
+
+def explain(query):
+    database = query.model._meta.database
+    sql, params = query.sql()
+    # sqlite3 caches prepared statements by text and a cached EXPLAIN is
+    # not re-planned after DROP INDEX, so the schema version keys the text.
+    versao = database.execute_sql('PRAGMA schema_version').fetchone()[0]
+    cursor = database.execute_sql(
+        'EXPLAIN QUERY PLAN /* schema {0} */ {1}'.format(versao, sql), params)
+    return [row[-1] for row in cursor.fetchall()]
+
+
+def registered_views():
+    return list(app.formPrincipal.views)
+
+
+def collect_views(module):
+    return [
+        obj for obj in vars(module).values()
+        if inspect.isclass(obj) and issubclass(obj, QListShow) and
+        obj.__module__ == module.__name__]
+
+
+class SpecView:
+    CACHE_QUERY = False
+
+    def __init__(self, cls, spec):
+        self.spec = spec
+        self.instancia_paginador = None
+        if cls.PAGE_SIZE is not None or cls.LIVE_FILTER:
+            self.instancia_paginador = KeysetPaginator(
+                cls.PAGE_SIZE or cls.PAGE_SIZES[0])
+        if issubclass(cls.LIST, BaseResultTable):
+            self.instancia_lista = SpecTable(self)
+        else:
+            self.instancia_lista = SpecList(self)
+
+    def get_all(self):
+        return self.spec.query
+
+    def order(self):
+        return self.spec.order
+
+    def filters(self):
+        return self.spec.filters
+
+    def columns(self):
+        return self.spec.columns
+
+    def footer(self):
+        return []
+
+
+class SpecResult:
+
+    def __init__(self, view):
+        self.view = view
+        self.filtros = []
+
+    def parent(self):
+        return self.view
+
+
+class SpecList(SpecResult, BaseResultList):
+    pass
+
+
+class SpecTable(SpecResult, BaseResultTable):
+    pass
+
+
+def view_queries(view):
+    lista = view.instancia_lista
+    filtros = lista.filtros
+    try:
+        lista.filtros = []
+        yield 'order', lista.get_query(), None
+        for f in view.filters():
+            lista.filtros = [{
+                "entity": f["entity"], "operator": f["operator"],
+                "value": sample_value(f)}]
+            label = '{0} {1}'.format(
+                f.get("label", f["entity"].name), f["operator"])
+            yield label, lista.get_query(), f
+    finally:
+        lista.filtros = filtros
+
+
+def indexed_field(expr):
+    if isinstance(expr, peewee.FieldAlias):
+        return expr.field
+    if isinstance(expr, peewee.Field):
+        return expr
+    if isinstance(expr, peewee.Function):
+        for argumento in expr.arguments:
+            field = indexed_field(argumento)
+            if field is not None:
+                return field
+    return None
+
+
+def index_for(expr, nocase=False):
+    field = indexed_field(expr)
+    if field is None or field.primary_key:
+        return None, None
+    model = field.model
+    tabela = model._meta.table_name
+    funcao = isinstance(expr, peewee.Function)
+    if funcao:
+        nome = '{0}_{1}_{2}'.format(tabela, field.column_name, expr.name)
+        expr = peewee.Function(expr.name, [field])
+    else:
+        nome = '{0}_{1}'.format(tabela, field.column_name)
+        expr = field
+    if nocase:
+        nome += '_nocase'
+        expr = sem_caixa(expr)
+    for index in model._meta.database.get_indexes(tabela):
+        if index.name == nome or (
+                not funcao and not nocase and
+                index.columns[:1] == [field.column_name]):
+            return None, None
+    return model, peewee.Index(nome, model._meta.table, [expr], safe=True)
+
+
+def advise_view(cls):
+    spec = cls.query_spec()
+    if spec is None:
+        return []
+    view = SpecView(cls, spec)
+    advices = []
+    for label, query, f in view_queries(view):
+        if not isinstance(query, peewee.Query):
+            continue
+        detalhes = explain(query)
+        if f is None:
+            if 'USE TEMP B-TREE FOR ORDER BY' not in detalhes:
+                continue
+            expr = split_order(view.instancia_lista.ordem())[0]
+            model, index = index_for(expr)
+            advices.append(Advice(
+                cls.__name__, label, TEMP_BTREE,
+                'USE TEMP B-TREE FOR ORDER BY', model, index,
+                None if index else 'order by an indexed column'))
+            continue
+        scans = [d for d in detalhes if SCAN.match(d)]
+        if len(scans) == 0:
+            continue
+        if f["operator"] == '%':
+            model, index = None, None
+            hint = 'declare a FullTextIndex for this field'
+        else:
+            model, index = index_for(
+                f["entity"], f["operator"] == 'startswith')
+            if index is None and indexed_field(f["entity"]) is not None:
+                continue
+            hint = None if index else 'filter on an indexed column'
+        advices.append(Advice(
+            cls.__name__, label, FULL_SCAN, scans[0], model, index, hint))
+    return advices
+
+
+def advise(views=None):
+    advices = []
+    for cls in registered_views() if views is None else views:
+        advices.extend(advise_view(cls))
+    return advices
+
+
+def index_sql(model, index):
+    return model._meta.database.get_sql_context().sql(index).query()[0]
+
+
+def create_indexes(advices):
+    criados = []
+    for advice in advices:
+        if advice.index is None or advice.index._name in criados:
+            continue
+        advice.model._meta.database.execute(advice.index)
+        criados.append(advice.index._name)
+    return criados
+
+
+def report(advices, out=sys.stdout):
+    for advice in advices:
+        out.write('{0} [{1}]: {2} ({3})\n'.format(
+            advice.view, advice.label, advice.kind, advice.detail))
+        if advice.index is not None:
+            out.write('    {0}\n'.format(
+                index_sql(advice.model, advice.index)))
+        else:
+            out.write('    {0}\n'.format(advice.hint))
+    if len(advices) == 0:
+        out.write('No full scans or temp b-trees found.\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Explain the queries of QListShow views and suggest '
+                    'indexes.')
+    parser.add_argument('module', help='module declaring the views')
+    parser.add_argument(
+        '--create', action='store_true', help='create the suggested indexes')
+    args = parser.parse_args(argv)
+    advices = advise(collect_views(importlib.import_module(args.module)))
+    report(advices)
+    if args.create:
+        for nome in create_indexes(advices):
+            print('Created index {0}.'.format(nome))
+    return 1 if len(advices) > 0 and not args.create else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,16 +1,30 @@
 from datetime import date
+import locale
+import logging
 import os
 import sys
+import time
 import unittest
+from unittest import mock
 
-from PyQt5.QtCore import Qt
+from PyQt5 import sip
+from PyQt5.QtCore import QEvent, Qt
 from PyQt5.QtTest import QTest
 from PyQt5.QtWidgets import QApplication
 from qtpeewee import (
     QCharEdit, QDateWithCalendarEdit, QIntEdit, QHiddenEdit, MyQListWidgetItem,
     QFormulario, QDialogButtonBox, QDecimalEdit, QRegExpEdit, QFormWidget,
-    QResultList)
-from peewee import SqliteDatabase, Model, CharField, IntegerField, DateField
+    QResultList, IdentityMap, KeysetPaginator, QueryWorker, order_by_key,
+    posicao_ordenada, qt_to_strftime, hybrid_property_field, alias_expression,
+    sql_expression, QSearchForm, FullTextIndex, full_text_match,
+    BaseFilteredResult, QListShow, QTableShow, QFkComboBox, OPTION_MODELS,
+    invalidate_options, QChoicesComboBox, ChoiceField, QGridForm, FORM_SPECS,
+    FORM_POOL, BaseEdit, identity_map, QLazyResultTable, ExportWorker,
+    QLazyResultList, prefetch_related, QuerySpec)
+from qtpeewee import advisor
+from peewee import (
+    SqliteDatabase, Model, CharField, IntegerField, DateField, Case,
+    ForeignKeyField, IntegrityError, fn)
 
 
 app = QApplication(sys.argv)
@@ -214,6 +228,14 @@ class User(Model):
     idade = IntegerField()
     data = DateField()
 
+    @hybrid_property_field
+    def faixa(self):
+        return 'adulto' if self.idade >= 18 else 'menor'
+
+    @faixa.expression
+    def faixa(cls):
+        return Case(None, [(cls.idade >= 18, 'adulto')], 'menor')
+
     class Meta:
         database = db
 
@@ -343,4 +365,1260 @@ class MyQListWidgetItemTest(unittest.TestCase):
         op = MyQListWidgetItem(QResultList(), objeto=objeto)
         self.assertEqual(op.text(), str(objeto))
 
+
+class IdentityMapTest(unittest.TestCase):
+    def limpa_base(self):
+        User.delete().execute()
+
+    def test_reaproveita_objeto(self):
+        self.limpa_base()
+        u = user_factory()
+        cache = IdentityMap()
+        cache.enable()
+        self.assertIs(
+            cache.get_by_id(User, u.id), cache.get_by_id(User, u.id))
+
+    def test_desabilitado_nao_guarda(self):
+        self.limpa_base()
+        u = user_factory()
+        cache = IdentityMap()
+        cache.get_by_id(User, u.id)
+        self.assertEqual(len(cache), 0)
+
+    def test_descarta_menos_usado(self):
+        self.limpa_base()
+        a = user_factory(username='a')
+        b = user_factory(username='b')
+        c = user_factory(username='c')
+        cache = IdentityMap()
+        cache.enable(maxsize=2)
+        cache.get_by_id(User, a.id)
+        cache.get_by_id(User, b.id)
+        cache.get_by_id(User, a.id)
+        cache.get_by_id(User, c.id)
+        self.assertIsNotNone(cache.get(User, a.id))
+        self.assertIsNone(cache.get(User, b.id))
+
+    def test_invalida(self):
+        self.limpa_base()
+        u = user_factory()
+        cache = IdentityMap()
+        cache.enable()
+        cache.get_by_id(User, u.id)
+        cache.invalidate(User, u.id)
+        self.assertIsNone(cache.get(User, u.id))
+
+
+class KeysetPaginatorTest(unittest.TestCase):
+    def limpa_base(self):
+        User.delete().execute()
+
+    def percorre(self, paginador, order):
+        ids = []
+        while True:
+            rows = paginador.receive(
+                list(paginador.paginate(User.select(), order)))
+            ids += [r.id for r in rows]
+            if not paginador.has_next:
+                return ids
+            paginador.next()
+
+    def test_percorre_todas_as_paginas(self):
+        self.limpa_base()
+        for i in range(10):
+            user_factory(username=str(i), idade=i % 3)
+        paginador = KeysetPaginator(page_size=3)
+        ids = self.percorre(paginador, User.idade)
+        self.assertEqual(len(ids), 10)
+        self.assertEqual(len(set(ids)), 10)
+        self.assertEqual(paginador.page, 4)
+
+    def test_ordem_decrescente(self):
+        self.limpa_base()
+        for i in range(10):
+            user_factory(username=str(i), idade=i % 3)
+        ids = self.percorre(KeysetPaginator(page_size=4), User.idade.desc())
+        idades = [User.get_by_id(i).idade for i in ids]
+        self.assertEqual(idades, sorted(idades, reverse=True))
+
+    def test_volta_pagina(self):
+        self.limpa_base()
+        for i in range(5):
+            user_factory(username=str(i))
+        paginador = KeysetPaginator(page_size=2)
+        primeira = paginador.receive(list(paginador.paginate(User.select())))
+        paginador.next()
+        paginador.receive(list(paginador.paginate(User.select())))
+        paginador.previous()
+        novamente = paginador.receive(list(paginador.paginate(User.select())))
+        self.assertEqual(
+            [r.id for r in primeira], [r.id for r in novamente])
+
+
+class QueryWorkerTest(unittest.TestCase):
+    def limpa_base(self):
+        User.delete().execute()
+
+    def executa(self, worker):
+        recebidos = []
+        terminou = []
+        worker.signals.chunk.connect(lambda w, rows: recebidos.append(rows))
+        worker.signals.finished.connect(lambda w: terminou.append(w))
+        worker.start()
+        while len(terminou) == 0:
+            app.processEvents()
+        return recebidos
+
+    def test_entrega_em_blocos(self):
+        self.limpa_base()
+        for i in range(5):
+            user_factory(username=str(i))
+        worker = QueryWorker(User.select(), lambda rows: [r.id for r in rows])
+        worker.CHUNK_SIZE = 2
+        recebidos = self.executa(worker)
+        self.assertEqual([len(rows) for rows in recebidos], [2, 2, 1])
+
+    def test_cancelada_nao_entrega(self):
+        self.limpa_base()
+        user_factory()
+        worker = QueryWorker(User.select())
+        worker.cancel()
+        self.assertEqual(self.executa(worker), [])
+
+    def test_cancelamento_interrompe_consulta_em_execucao(self):
+        self.limpa_base()
+        for i in range(100):
+            user_factory(username=str(i))
+        a, b, c = User.alias(), User.alias(), User.alias()
+        worker = QueryWorker(
+            User.select(fn.COUNT(1)).from_(User, a, b, c).tuples())
+        falhas = []
+        worker.signals.failed.connect(lambda w, e: falhas.append(e))
+        terminou = []
+        worker.signals.finished.connect(lambda w: terminou.append(w))
+        self.assertTrue(worker.threaded())
+        worker.start()
+        QTest.qWait(100)
+        inicio = time.time()
+        worker.cancel()
+        while len(terminou) == 0:
+            app.processEvents()
+        self.assertLess(time.time() - inicio, 1)
+        self.assertFalse(worker.concluido)
+        self.assertEqual(falhas, [])
+
+    def test_banco_em_memoria_executa_na_thread_atual(self):
+        memoria = SqliteDatabase(':memory:')
+
+        class Nota(Model):
+            texto = CharField()
+
+            class Meta:
+                database = memoria
+
+        Nota.create_table()
+        Nota.create(texto='a')
+        worker = QueryWorker(
+            Nota.select(), lambda rows: [r.texto for r in rows])
+        falhas = []
+        worker.signals.failed.connect(lambda w, e: falhas.append(e))
+        self.assertFalse(worker.threaded())
+        self.assertEqual(self.executa(worker), [['a']])
+        self.assertEqual(falhas, [])
+
+
+class PosicaoOrdenadaTest(unittest.TestCase):
+    def limpa_base(self):
+        User.delete().execute()
+
+    def carrega(self, order):
+        return list(order_by_key(User.select(), order))
+
+    def test_insere_na_ordem(self):
+        self.limpa_base()
+        for i in (1, 3, 5):
+            user_factory(username=str(i), idade=i)
+        novo = user_factory(username='4', idade=4)
+        rows = [r for r in self.carrega(User.idade) if r.id != novo.id]
+        item = [r for r in self.carrega(User.idade) if r.id == novo.id][0]
+        self.assertEqual(posicao_ordenada(rows, item, User.idade), 2)
+
+    def test_insere_na_ordem_decrescente(self):
+        self.limpa_base()
+        for i in (1, 3, 5):
+            user_factory(username=str(i), idade=i)
+        novo = user_factory(username='4', idade=4)
+        ordem = User.idade.desc()
+        rows = [r for r in self.carrega(ordem) if r.id != novo.id]
+        item = [r for r in self.carrega(ordem) if r.id == novo.id][0]
+        self.assertEqual(posicao_ordenada(rows, item, ordem), 1)
+
+
+class QtToStrftimeTest(unittest.TestCase):
+    def test_converte_formato_numerico(self):
+        self.assertEqual(
+            qt_to_strftime('dd/MM/yyyy hh:mm:ss'), '%d/%m/%Y %H:%M:%S')
+        self.assertEqual(
+            date(2018, 3, 4).strftime(qt_to_strftime('dd/MM/yyyy')),
+            '04/03/2018')
+
+    def test_formato_do_qt_nao_convertido(self):
+        self.assertIsNone(qt_to_strftime('d MMM yyyy'))
+        self.assertIsNone(qt_to_strftime("dd 'de' MMMM"))
+        self.assertIsNone(qt_to_strftime('hh:mm AP'))
+
+
+class HybridPropertyFieldTest(unittest.TestCase):
+    def limpa_base(self):
+        User.delete().execute()
+
+    def test_valor_calculado_no_select(self):
+        self.limpa_base()
+        user_factory(username='a', idade=10)
+        user_factory(username='b', idade=40)
+        query = User.select(User.id, User.idade, alias_expression(
+            User.faixa.expression, 'faixa')).order_by(User.idade)
+        self.assertEqual(
+            [str(u.faixa) for u in query], ['menor', 'adulto'])
+        self.assertEqual(query[0].__dict__['faixa'], 'menor')
+
+    def test_calcula_por_instancia_sem_select(self):
+        self.limpa_base()
+        u = user_factory(idade=40)
+        self.assertEqual(str(User.get_by_id(u.id).faixa), 'adulto')
+
+    def test_filtra_e_ordena_pela_expressao(self):
+        self.limpa_base()
+        for i, idade in enumerate((10, 40, 20)):
+            user_factory(username=str(i), idade=idade)
+        query = User.select().where(
+            sql_expression(User.faixa) == 'adulto').order_by(
+            User.faixa.desc(), User.idade)
+        self.assertEqual([u.idade for u in query], [20, 40])
+
+
+class QSearchFormTest(unittest.TestCase):
+    def formulario(self):
+        form = QSearchForm.get(None, [{
+            "entity": User.nome, "type": QCharEdit, "operator": "%"}])
+        emitidos = []
+        form.alterado.connect(lambda: emitidos.append(True))
+        return form, emitidos
+
+    def test_filtro_ao_digitar_agrupa_alteracoes(self):
+        form, emitidos = self.formulario()
+        form.set_live(20)
+        QTest.keyClicks(form.nome, 'mar')
+        self.assertEqual(len(emitidos), 0)
+        QTest.qWait(100)
+        self.assertEqual(len(emitidos), 1)
+
+    def test_sem_filtro_ao_digitar(self):
+        form, emitidos = self.formulario()
+        QTest.keyClicks(form.nome, 'mar')
+        QTest.qWait(50)
+        self.assertEqual(len(emitidos), 0)
+
+
+class FullTextIndexTest(unittest.TestCase):
+    def setUp(self):
+        User.delete().execute()
+        self.index = FullTextIndex(User, User.nome)
+        self.index.create()
+
+    def tearDown(self):
+        self.index.drop()
+
+    def filtra(self, valor):
+        return [u.username for u in User.select().where(
+            full_text_match(User.nome, valor)).order_by(User.username)]
+
+    def test_busca_contem_pelo_indice(self):
+        user_factory(username='1', nome='Maria Silva')
+        user_factory(username='2', nome='Mariana')
+        user_factory(username='3', nome='Joana')
+        self.assertEqual(self.filtra('aria'), ['1', '2'])
+
+    def test_acompanha_alteracoes(self):
+        user = user_factory(username='1', nome='Maria')
+        user.nome = 'Joana'
+        user.save()
+        self.assertEqual(self.filtra('ari'), [])
+        self.assertEqual(self.filtra('oan'), ['1'])
+
+    def test_ignora_colunas_nao_indexadas(self):
+        user_factory(username='1', nome='Maria')
+        indexados = []
+        db.connection().set_trace_callback(
+            lambda sql: indexados.append(sql) if 'user_fts' in sql else None)
+        try:
+            User.update(idade=40).execute()
+            self.assertEqual(indexados, [])
+            User.update(nome='Joana').execute()
+            self.assertNotEqual(indexados, [])
+        finally:
+            db.connection().set_trace_callback(None)
+        self.assertEqual(self.filtra('oan'), ['1'])
+
+    def test_termo_curto_usa_like(self):
+        self.assertIsNone(full_text_match(User.nome, 'ma'))
+
+
+class Filtrado(BaseFilteredResult):
+    def __init__(self, *filtros):
+        self.filtros = list(filtros)
+
+    def usernames(self):
+        return [u.username for u in self.aplica_filtros(
+            User.select()).order_by(User.username)]
+
+
+class FilterOperatorsTest(unittest.TestCase):
+    def setUp(self):
+        User.delete().execute()
+        for i, nome in enumerate(['Ana', 'Anabela', 'Bruna', 'Carla']):
+            user_factory(
+                username=str(i), nome=nome, idade=10 * (i + 1),
+                data=date(2020, 1, i + 1))
+
+    def filtra(self, operador, valor, entity=User.idade):
+        return Filtrado({
+            "entity": entity, "operator": operador,
+            "value": valor}).usernames()
+
+    def test_comparacoes(self):
+        self.assertEqual(self.filtra('<=', 20), ['0', '1'])
+        self.assertEqual(self.filtra('>=', 30), ['2', '3'])
+        self.assertEqual(self.filtra('between', (20, 30)), ['1', '2'])
+        self.assertEqual(self.filtra('between', (None, 10)), ['0'])
+        self.assertEqual(self.filtra('in', '10, 40'), ['0', '3'])
+
+    def test_inicia_com(self):
+        self.assertEqual(
+            self.filtra('startswith', 'Ana', User.nome), ['0', '1'])
+
+    def test_inicia_com_ignora_caixa(self):
+        self.assertEqual(
+            self.filtra('startswith', 'ana', User.nome), ['0', '1'])
+        self.assertEqual(
+            self.filtra('startswith', 'ANAB', User.nome), ['1'])
+        self.assertEqual(
+            self.filtra('startswith', 'carlA', User.nome), ['3'])
+
+    def test_datas(self):
+        self.assertEqual(self.filtra('since', '2020-01-03', User.data),
+                         ['2', '3'])
+        self.assertEqual(self.filtra('until', '2020-01-02', User.data),
+                         ['0', '1'])
+        self.assertEqual(self.filtra('day', '2020-01-02', User.data), ['1'])
+
+    def test_valor_vazio_ignora_filtro(self):
+        self.assertEqual(len(self.filtra('=', '')), 4)
+
+    def test_compila_apenas_quando_filtros_mudam(self):
+        filtrado = Filtrado({"entity": User.idade, "operator": "=",
+                             "value": 10})
+        compilados = filtrado.filtros_compilados()
+        self.assertIs(filtrado.filtros_compilados(), compilados)
+        filtrado.filtros = []
+        self.assertEqual(filtrado.filtros_compilados(), [])
+
+    def test_recompila_quando_lista_muda_no_lugar(self):
+        filtrado = Filtrado({"entity": User.idade, "operator": ">=",
+                             "value": 20})
+        self.assertEqual(filtrado.usernames(), ['1', '2', '3'])
+        filtrado.filtros.append(
+            {"entity": User.idade, "operator": "<", "value": 40})
+        self.assertEqual(filtrado.usernames(), ['1', '2'])
+
+
+class UserListShow(QListShow):
+    @classmethod
+    def query_spec(cls):
+        return QuerySpec(User.select(), order=User.nome, filters=[
+            {"entity": User.email, "type": QCharEdit, "operator": "="}])
+
+
+class AdvisorTest(unittest.TestCase):
+    def tearDown(self):
+        db.execute_sql('DROP INDEX IF EXISTS "user_nome"')
+        db.execute_sql('DROP INDEX IF EXISTS "user_email"')
+
+    def test_sugere_indices(self):
+        advices = advisor.advise([UserListShow])
+        self.assertEqual(
+            [(a.kind, a.index._name) for a in advices],
+            [(advisor.TEMP_BTREE, 'user_nome'),
+             (advisor.FULL_SCAN, 'user_email')])
+
+    def test_indices_criados_resolvem(self):
+        advisor.create_indexes(advisor.advise([UserListShow]))
+        self.assertEqual(advisor.advise([UserListShow]), [])
+
+    def test_nao_constroi_a_tela(self):
+        class SemTela(UserListShow):
+            def __init__(self):
+                raise AssertionError('view instantiated')
+        self.assertEqual(len(advisor.advise([SemTela])), 2)
+
+    def test_ignora_tela_sem_especificacao(self):
+        class SemEspecificacao(QListShow):
+            def get_all(self):
+                return User.select().order_by(User.email)
+
+        self.assertEqual(advisor.advise([SemEspecificacao]), [])
+
+    def test_tabela_inclui_colunas_calculadas(self):
+        class PorFaixa(QTableShow):
+            @classmethod
+            def query_spec(cls):
+                return QuerySpec(
+                    User.select(), order=User.faixa,
+                    columns=[User.nome, User.faixa])
+
+        advices = advisor.advise([PorFaixa])
+        self.assertEqual(
+            [(a.kind, a.index) for a in advices], [(advisor.TEMP_BTREE, None)])
+
+    def test_prefixo_sugere_indice_sem_caixa(self):
+        class PorPrefixo(UserListShow):
+            @classmethod
+            def query_spec(cls):
+                return QuerySpec(User.select(), filters=[
+                    {"entity": User.nome, "type": QCharEdit,
+                     "operator": "startswith"}])
+
+        db.execute_sql('CREATE INDEX "user_nome" ON "user" ("nome")')
+        advices = advisor.advise([PorPrefixo])
+        self.assertEqual(
+            [a.index._name for a in advices], ['user_nome_nocase'])
+        self.assertIn('COLLATE NOCASE', advisor.index_sql(
+            advices[0].model, advices[0].index))
+        advisor.create_indexes(advices)
+        try:
+            self.assertEqual(advisor.advise([PorPrefixo]), [])
+        finally:
+            db.execute_sql('DROP INDEX IF EXISTS "user_nome_nocase"')
+
+
+class ContaConsultas(UserListShow):
+    consultas = 0
+
+    def get_all(self):
+        ContaConsultas.consultas += 1
+        return User.select()
+
+
+class ConsultaBaseTest(unittest.TestCase):
+    def setUp(self):
+        User.delete().execute()
+        for i, nome in enumerate(['Ana', 'Rui']):
+            user_factory(username=str(i), nome=nome)
+        ContaConsultas.consultas = 0
+
+    def nomes(self, show):
+        while show.instancia_lista.is_busy():
+            app.processEvents()
+        return [u.nome for u in show.instancia_lista.values]
+
+    def test_reaproveita_consulta_base(self):
+        show = ContaConsultas()
+        self.nomes(show)
+        show.instancia_lista.filtros = [
+            {"entity": User.nome, "operator": "=", "value": 'Rui'}]
+        show.atualiza_lista()
+        self.assertEqual(self.nomes(show), ['Rui'])
+        self.assertEqual(ContaConsultas.consultas, 1)
+
+    def test_sem_cache_monta_a_cada_consulta(self):
+        class SemCache(ContaConsultas):
+            CACHE_QUERY = False
+
+        show = SemCache()
+        self.nomes(show)
+        show.atualiza_lista()
+        self.assertEqual(self.nomes(show), ['Ana', 'Rui'])
+        self.assertEqual(ContaConsultas.consultas, 2)
+
+
+class UserTableShow(QTableShow):
+    def get_all(self):
+        return User.select()
+
+    def columns(self):
+        return [User.nome, User.idade, (User.data, 'dd/MM/yyyy')]
+
+    def footer(self):
+        return [(User.nome, 'count'), (User.idade, 'avg'), (User.data, 'max')]
+
+
+class UserFaixaTableShow(UserTableShow):
+    def columns(self):
+        return [User.nome, User.faixa]
+
+    def footer(self):
+        return [(User.faixa, 'max')]
+
+
+class ConsultasRegistradas(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.consultas = []
+
+    def emit(self, record):
+        self.consultas.append(record.getMessage())
+
+
+class FooterTest(unittest.TestCase):
+    def setUp(self):
+        self.locale = locale.setlocale(locale.LC_NUMERIC)
+        locale.setlocale(locale.LC_NUMERIC, 'C')
+        User.delete().execute()
+        user_factory(username='1', idade=20, data=date(2020, 1, 2))
+        user_factory(username='2', idade=15, data=date(2021, 3, 4))
+
+    def tearDown(self):
+        locale.setlocale(locale.LC_NUMERIC, self.locale)
+
+    def totais(self, tabela):
+        while (tabela.is_busy() or
+               tabela.instancia_lista.worker_totais is not None):
+            app.processEvents()
+        app.processEvents()
+        colunas = tabela.rodape.columnCount()
+        return [tabela.rodape.item(0, i).text() for i in range(colunas)]
+
+    def test_totaliza_com_uma_consulta(self):
+        tabela = UserTableShow()
+        self.assertEqual(self.totais(tabela), ['2', '17.50', '04/03/2021'])
+        registro = ConsultasRegistradas()
+        logger = logging.getLogger('peewee')
+        nivel = logger.level
+        logger.setLevel(logging.DEBUG)
+        logger.addHandler(registro)
+        try:
+            tabela.instancia_lista.atualiza_totais()
+            self.totais(tabela)
+        finally:
+            logger.removeHandler(registro)
+            logger.setLevel(nivel)
+        self.assertEqual(len(registro.consultas), 1)
+
+    def test_totaliza_coluna_calculada(self):
+        tabela = UserFaixaTableShow()
+        self.assertEqual(self.totais(tabela), ['', 'menor'])
+
+    def test_lista_nao_monta_rodape(self):
+        class ListaComRodape(UserListShow):
+            def footer(self):
+                return [(User.idade, 'sum')]
+
+        lista = ListaComRodape()
+        lista.atualiza_totais()
+        self.assertFalse(hasattr(lista, 'rodape'))
+
+
+class ExportTest(unittest.TestCase):
+    def exporta(self, caminho):
+        User.delete().execute()
+        user_factory(username='1', nome='Ana', idade=20, data=date(2020, 1, 2))
+        user_factory(username='2', nome='Rui', idade=25, data=date(2021, 3, 4))
+        tabela = UserTableShow()
+        while (tabela.is_busy() or
+               tabela.instancia_lista.worker_totais is not None):
+            app.processEvents()
+        self.worker = tabela.exporta(caminho)
+        while not self.worker.arquivo.closed:
+            app.processEvents()
+        QTest.qWait(50)
+        with open(caminho, encoding='utf-8') as arquivo:
+            linhas = arquivo.read().splitlines()
+        os.remove(caminho)
+        return linhas
+
+    def test_exporta_csv(self):
+        self.assertEqual(self.exporta('export.csv'), [
+            'Nome,Idade,Data', 'Ana,20,02/01/2020', 'Rui,25,04/03/2021'])
+
+    def test_exporta_json_lines(self):
+        self.assertEqual(
+            self.exporta('export.jsonl')[0],
+            '{"Nome": "Ana", "Idade": "20", "Data": "02/01/2020"}')
+
+    def test_mantem_arquivo_apos_fechar_progresso(self):
+        self.assertEqual(len(self.exporta('export.csv')), 3)
+        self.assertFalse(self.worker.cancelled)
+        self.assertTrue(self.worker.concluido)
+
+    def test_remove_arquivo_se_falhar(self):
+        User.delete().execute()
+        user_factory()
+        worker = ExportWorker(
+            User.select(), 'falha.csv', ['Nome'], [lambda user: 1 / 0])
+        falhas = []
+        worker.signals.failed.connect(lambda w, erro: falhas.append(erro))
+        worker.start()
+        while not worker.arquivo.closed:
+            app.processEvents()
+        QTest.qWait(50)
+        self.assertIsInstance(falhas[0], ZeroDivisionError)
+        self.assertFalse(worker.concluido)
+        self.assertFalse(os.path.exists('falha.csv'))
+
+
+class Perfil(Model):
+    user = ForeignKeyField(User, null=True)
+
+    class Meta:
+        database = db
+
+
+Perfil.create_table()
+
+
+class QFkComboBoxLazyTest(unittest.TestCase):
+    def setUp(self):
+        User.delete().execute()
+        self.users = [
+            user_factory(username=str(i), nome=nome) for i, nome in
+            enumerate(['Mariana', 'Mario', 'Marta', 'Joana'])]
+        self.combo = QFkComboBox(User, Perfil.user, lazy=True)
+        self.combo.SEARCH_LIMIT = 2
+
+    def test_nao_carrega_ao_construir(self):
+        self.assertEqual(self.combo.sugestoes, [])
+        self.assertIsNone(self.combo.get_valor())
+
+    def test_pesquisa_por_prefixo_com_limite(self):
+        self.combo.pesquisa('Mar')
+        self.assertEqual(
+            [u.nome for u in self.combo.sugestoes], ['Mariana', 'Mario'])
+
+    def test_define_valor_pela_chave(self):
+        self.combo.set_valor(self.users[3].id)
+        self.assertEqual(self.combo.get_valor().nome, 'Joana')
+        self.combo.set_valor(None)
+        self.assertIsNone(self.combo.get_valor())
+
+
+class FkOptionsTest(unittest.TestCase):
+    def setUp(self):
+        User.delete().execute()
+        OPTION_MODELS.clear()
+        self.users = [
+            user_factory(username=str(i), nome=nome) for i, nome in
+            enumerate(['Mariana', 'Joana'])]
+        self.combos = [QFkComboBox(User, Perfil.user) for i in range(3)]
+
+    def test_compartilha_opcoes(self):
+        self.assertEqual(len(OPTION_MODELS), 1)
+        opcoes = self.combos[0].opcoes
+        self.assertEqual(opcoes.refs, 3)
+        for combo in self.combos:
+            self.assertIs(combo.values, opcoes.values)
+
+    def test_atualiza_uma_vez_ao_salvar(self):
+        self.combos[0].set_valor(self.users[1].id)
+        user_factory(username='9', nome='Ana')
+        invalidate_options(User)
+        for combo in self.combos:
+            self.assertEqual(len(combo.values), 3)
+        self.assertIs(self.combos[1].values, self.combos[2].values)
+        self.assertEqual(
+            self.combos[0].currentText(), str(self.users[1].id))
+
+    def test_libera_ao_destruir(self):
+        for combo in self.combos:
+            combo.deleteLater()
+        app.sendPostedEvents(None, QEvent.DeferredDelete)
+        self.assertEqual(len(OPTION_MODELS), 0)
+
+
+class ComboIndiceTest(unittest.TestCase):
+    def setUp(self):
+        User.delete().execute()
+        OPTION_MODELS.clear()
+        self.users = [
+            user_factory(username=str(i), nome=nome) for i, nome in
+            enumerate(['Mariana', 'Joana', 'Ana'])]
+
+    def test_define_e_le_o_mesmo_valor(self):
+        for field in (Perfil.user, User.id):
+            combo = QFkComboBox(User, field)
+            combo.set_valor(self.users[1].id)
+            self.assertEqual(combo.get_valor().id, self.users[1].id)
+            combo.set_valor(self.users[2])
+            self.assertEqual(combo.get_valor().id, self.users[2].id)
+
+    def test_carrega_apenas_campos_exibidos(self):
+        combo = QFkComboBox(User, Perfil.user, display_fields=[User.nome])
+        self.assertEqual(
+            [u.__data__ for u in combo.values],
+            [{'id': u.id, 'nome': u.nome} for u in self.users])
+        combo = QFkComboBox(User, Perfil.user)
+        self.assertEqual(combo.values[0].__data__, {'id': self.users[0].id})
+
+    def test_escolhas_com_item_vazio(self):
+        field = ChoiceField(null=True, values=[
+            {'id': 'a', 'name': 'A'}, {'id': 'b', 'name': 'B'}])
+        combo = QChoicesComboBox(field)
+        combo.set_valor('b')
+        self.assertEqual(combo.currentText(), 'B')
+        self.assertEqual(combo.get_valor(), 'b')
+
+
+class FormularioPerfil(QGridForm):
+    ENTIDADE = Perfil
+    chamadas = 0
+
+    def meta(self):
+        FormularioPerfil.chamadas += 1
+        return {'user': {'display_fields': [User.nome], 'x': 1, 'y': 2}}
+
+
+class FormSpecTest(unittest.TestCase):
+    def setUp(self):
+        FORM_SPECS.clear()
+        FormularioPerfil.chamadas = 0
+
+    def test_calcula_especificacao_uma_vez(self):
+        primeiro = FormularioPerfil.get()
+        segundo = FormularioPerfil.get()
+        self.assertEqual(FormularioPerfil.chamadas, 1)
+        self.assertEqual(list(FORM_SPECS), [FormularioPerfil])
+        self.assertIsNot(primeiro.user, segundo.user)
+
+    def test_aplica_meta(self):
+        form = FormularioPerfil.get()
+        self.assertEqual((form.user.x, form.user.y), (1, 2))
+        self.assertEqual(form.user.display_fields, [User.nome])
+
+    def test_meta_sobrescreve_argumentos_do_campo(self):
+        class FormularioUserLivre(QGridForm):
+            ENTIDADE = User
+
+            def meta(self):
+                return {
+                    'nome': {'is_required': False, 'max_length': 5},
+                    'idade': {'is_required': False}}
+
+        form = FormularioUserLivre.get()
+        self.assertFalse(form.nome.is_required)
+        self.assertEqual(form.nome.max_length, 5)
+        self.assertFalse(form.idade.is_required)
+        self.assertEqual(form.idade.field_type, BaseEdit.INTEGER)
+
+    def test_sem_cache_avalia_meta_por_instancia(self):
+        class FormularioDinamico(FormularioPerfil):
+            CACHE_SPEC = False
+
+        FormularioDinamico.get()
+        chamadas = FormularioPerfil.chamadas
+        FormularioDinamico.get()
+        self.assertGreater(FormularioPerfil.chamadas, chamadas)
+        self.assertNotIn(FormularioDinamico, FORM_SPECS)
+
+
+class FormularioPessoa(QFormulario):
+    ENTIDADE = User
+    TITLE = 'Pessoa'
+
+    def fields(self):
+        QFormulario.fields(self)
+        self.idade.set_valor(18)
+
+
+class FormPoolTest(unittest.TestCase):
+    def setUp(self):
+        User.delete().execute()
+        FORM_POOL.clear()
+        self.users = [
+            user_factory(username=str(i), nome=nome, idade=i + 30) for i, nome
+            in enumerate(['Mariana', 'Joana'])]
+
+    def test_reaproveita_e_preenche(self):
+        widget = QFormWidget.obtem(self.users[0].id, FormularioPessoa)
+        self.assertTrue(widget.libera())
+        reaproveitado = QFormWidget.obtem(self.users[1].id, FormularioPessoa)
+        self.assertIs(reaproveitado, widget)
+        form = widget.instancia_formulario
+        self.assertEqual(form.nome.get_valor(), 'Joana')
+        self.assertEqual(form.idade.get_valor(), 31)
+        self.assertEqual(form.objeto.id, self.users[1].id)
+
+    def test_novo_registro_volta_ao_padrao(self):
+        widget = QFormWidget.obtem(self.users[0].id, FormularioPessoa)
+        widget.libera()
+        widget = QFormWidget.obtem(None, FormularioPessoa)
+        form = widget.instancia_formulario
+        self.assertEqual(form.nome.get_valor(), '')
+        self.assertEqual(form.idade.get_valor(), 18)
+        self.assertIsNone(form.objeto)
+
+    def test_desconecta_ao_liberar(self):
+        salvos = []
+        widget = QFormWidget.obtem(self.users[0].id, FormularioPessoa)
+        widget.salvo.connect(salvos.append)
+        widget.libera()
+        widget.salvo.emit(1)
+        self.assertEqual(salvos, [])
+
+
+class DirtyTrackingTest(unittest.TestCase):
+    def setUp(self):
+        User.delete().execute()
+        self.user = user_factory(nome='Mariana', email='m@email.com')
+        self.widget = QFormWidget(self.user.id, formulario=FormularioPessoa)
+        self.form = self.widget.instancia_formulario
+        User.update(nome='Outra', email='outro@email.com').execute()
+
+    def test_nao_grava_sem_alteracao(self):
+        self.assertEqual(self.form.alterados(), [])
+        self.assertFalse(self.widget.salva_dados())
+        self.assertEqual(User.get_by_id(self.user.id).nome, 'Outra')
+
+    def test_grava_apenas_campos_alterados(self):
+        self.form.nome.set_valor('Joana')
+        self.assertEqual(self.form.alterados(), ['nome'])
+        self.assertTrue(self.widget.salva_dados())
+        user = User.get_by_id(self.user.id)
+        self.assertEqual(
+            (user.nome, user.email), ('Joana', 'outro@email.com'))
+        self.assertEqual(self.form.alterados(), [])
+
+
+class FormIdentityMapTest(unittest.TestCase):
+    def setUp(self):
+        User.delete().execute()
+        self.user = user_factory(nome='Mariana')
+        identity_map.enable()
+        self.cache = identity_map.get_by_id(User, self.user.id)
+        User.update(nome='Atual').execute()
+        self.widget = QFormWidget(self.user.id, formulario=FormularioPessoa)
+        self.form = self.widget.instancia_formulario
+
+    def tearDown(self):
+        identity_map.disable()
+
+    def test_carrega_linha_atual(self):
+        self.assertEqual(self.form.nome.get_valor(), 'Atual')
+        self.assertIsNot(self.form.objeto, self.cache)
+
+    def test_falha_ao_gravar_preserva_cache(self):
+        self.form.nome.set_valor('Joana')
+        with mock.patch.object(
+                User, 'save', side_effect=IntegrityError('falhou')):
+            with self.assertRaises(IntegrityError):
+                self.widget.salva_dados()
+        self.assertEqual(self.cache.nome, 'Mariana')
+        self.assertIs(identity_map.get(User, self.user.id), self.cache)
+
+    def test_invalida_cache_apos_gravar(self):
+        self.form.nome.set_valor('Joana')
+        self.assertTrue(self.widget.salva_dados())
+        self.assertIsNone(identity_map.get(User, self.user.id))
+        self.assertEqual(self.cache.nome, 'Mariana')
+
+
+class UserEditableShow(UserTableShow):
+    EDITABLE = True
+
+
+class InlineEditTest(unittest.TestCase):
+    def setUp(self):
+        User.delete().execute()
+        for i, nome in enumerate(['Ana', 'Rui', 'Eva']):
+            user_factory(username=str(i), nome=nome, idade=20)
+        self.tabela = UserEditableShow()
+        while self.tabela.is_busy():
+            app.processEvents()
+        self.lista = self.tabela.instancia_lista
+
+    def test_edita_pelo_delegate(self):
+        delegate = self.lista.itemDelegate()
+        index = self.lista.model().index(0, 1)
+        editor = delegate.createEditor(self.lista.viewport(), None, index)
+        delegate.setEditorData(editor, index)
+        self.assertEqual(editor.get_valor(), 20)
+        editor.set_valor(33)
+        delegate.setModelData(editor, self.lista.model(), index)
+        self.assertEqual(self.lista.item(0, 1).text(), '33')
+        self.assertEqual(
+            self.lista.pendentes, {self.lista.values[0].id: {'idade': 33}})
+
+    def test_nao_marca_celula_sem_alteracao(self):
+        delegate = self.lista.itemDelegate()
+        index = self.lista.model().index(0, 1)
+        editor = delegate.createEditor(self.lista.viewport(), None, index)
+        delegate.setEditorData(editor, index)
+        delegate.setModelData(editor, self.lista.model(), index)
+        self.assertEqual(self.lista.pendentes, {})
+
+    def test_editor_vazio_para_valor_nulo(self):
+        delegate = self.lista.itemDelegate()
+        index = self.lista.model().index(0, 1)
+        editor = delegate.createEditor(self.lista.viewport(), None, index)
+        editor.set_valor(7)
+        with mock.patch.object(self.lista, 'valor_celula', return_value=None):
+            delegate.setEditorData(editor, index)
+        self.assertEqual(editor.text(), '')
+        delegate.setModelData(editor, self.lista.model(), index)
+        self.assertEqual(self.lista.pendentes, {})
+
+    def test_grava_em_uma_transacao(self):
+        for row in range(3):
+            self.lista.edita(row, User.idade, '40', True)
+        self.lista.edita(1, User.nome, 'Rita', True)
+        self.assertTrue(self.tabela.salva_edicoes())
+        self.assertEqual(self.lista.pendentes, {})
+        self.assertEqual(
+            sorted((u.nome, u.idade) for u in User.select()),
+            [('Ana', 40), ('Eva', 40), ('Rita', 40)])
+
+    def test_nao_grava_linha_invalida(self):
+        self.lista.edita(0, User.idade, 50, True)
+        self.lista.edita(1, User.nome, '', False)
+        with mock.patch('qtpeewee.notifica_erro') as notifica_erro:
+            self.assertFalse(self.tabela.salva_edicoes())
+        self.assertTrue(notifica_erro.called)
+        self.assertEqual(
+            User.select().where(User.idade == 50).count(), 0)
+
+    def test_exibe_quantidade_pendente(self):
+        self.lista.edita(0, User.nome, 'Rita', True)
+        self.lista.edita(2, User.idade, 30, True)
+        self.assertEqual(
+            self.tabela.button_salvar.text(), 'Sa&lvar alterações (2)')
+        self.lista.update_result_set()
+        while self.tabela.is_busy():
+            app.processEvents()
+        self.assertEqual(len(self.lista.pendentes), 2)
+        self.tabela.descarta_edicoes()
+        self.assertEqual(
+            self.tabela.button_salvar.text(), 'Sa&lvar alterações')
+
+    def test_descarta(self):
+        self.lista.edita(0, User.nome, 'Rita', True)
+        self.tabela.descarta_edicoes()
+        self.assertEqual(self.lista.pendentes, {})
+        self.assertEqual(self.lista.item(0, 0).text(), 'Ana')
+
+
+class Chamado(Model):
+    titulo = CharField()
+    situacao = ChoiceField(values=[
+        {'id': 1, 'name': 'Novo'}, {'id': 2, 'name': 'Aberto'},
+        {'id': 3, 'name': 'Fechado'}])
+    user = ForeignKeyField(User, null=True)
+
+    class Meta:
+        database = db
+
+
+Chamado.create_table()
+
+
+class ChamadoTableShow(QTableShow):
+    def get_all(self):
+        return Chamado.select()
+
+    def columns(self):
+        return [
+            Chamado.titulo, (Chamado.user, 'nome'), (Chamado.situacao, 'name'),
+            (Chamado.user, 'faixa')]
+
+
+class ChamadoPaginadoShow(ChamadoTableShow):
+    PAGE_SIZE = 2
+
+
+class OrdenacaoTest(unittest.TestCase):
+    def setUp(self):
+        Chamado.delete().execute()
+        User.delete().execute()
+        joana = user_factory(username='j', nome='Joana')
+        ana = user_factory(username='a', nome='Ana')
+        for titulo, situacao, user in [
+                ('c1', 1, joana), ('c2', 3, None), ('c3', 2, ana),
+                ('c4', 1, ana)]:
+            Chamado.create(titulo=titulo, situacao=situacao, user=user)
+
+    def carrega(self, show):
+        while show.instancia_lista.is_busy():
+            app.processEvents()
+        return [c.titulo for c in show.instancia_lista.values]
+
+    def ordena(self, show, coluna):
+        show.instancia_lista.ordena_coluna(coluna)
+        return self.carrega(show)
+
+    def test_alterna_ascendente_e_descendente(self):
+        show = ChamadoTableShow()
+        self.assertEqual(self.ordena(show, 0), ['c1', 'c2', 'c3', 'c4'])
+        header = show.instancia_lista.horizontalHeader()
+        self.assertEqual(header.sortIndicatorOrder(), Qt.AscendingOrder)
+        self.assertEqual(self.ordena(show, 0), ['c4', 'c3', 'c2', 'c1'])
+        self.assertEqual(header.sortIndicatorOrder(), Qt.DescendingOrder)
+        self.assertEqual(self.ordena(show, 0), ['c1', 'c2', 'c3', 'c4'])
+
+    def test_ordena_chave_estrangeira_com_juncao_externa(self):
+        show = ChamadoTableShow()
+        lista = show.instancia_lista
+        self.assertEqual(self.ordena(show, 1), ['c2', 'c3', 'c4', 'c1'])
+        sql = lista.get_query().sql()[0]
+        self.assertIn('LEFT OUTER JOIN "user" AS', sql)
+
+    def test_ordena_escolhas_pelo_rotulo(self):
+        show = ChamadoTableShow()
+        self.assertEqual(self.ordena(show, 2), ['c3', 'c2', 'c1', 'c4'])
+        sql = show.instancia_lista.get_query().sql()[0]
+        self.assertIn('ORDER BY CASE', sql)
+
+    def test_pagina_apos_ordenar(self):
+        show = ChamadoPaginadoShow()
+        self.assertEqual(self.ordena(show, 1), ['c2', 'c3'])
+        paginador = show.instancia_paginador
+        paginador.next()
+        show.atualiza_lista()
+        self.assertEqual(self.carrega(show), ['c4', 'c1'])
+        self.assertFalse(paginador.has_next)
+
+    def test_coluna_sem_ordenacao(self):
+        show = ChamadoTableShow()
+        lista = show.instancia_lista
+        self.ordena(show, 0)
+        self.ordena(show, 0)
+        consultas = ConsultasRegistradas()
+        logger = logging.getLogger('peewee')
+        logger.addHandler(consultas)
+        logger.setLevel(logging.DEBUG)
+        try:
+            lista.ordena_coluna(3)
+        finally:
+            logger.removeHandler(consultas)
+        self.assertEqual(consultas.consultas, [])
+        self.assertEqual(lista.ordenacao.coluna, 0)
+        self.assertTrue(lista.ordenacao.desc)
+        header = lista.horizontalHeader()
+        self.assertEqual(header.sortIndicatorSection(), 0)
+        self.assertEqual(header.sortIndicatorOrder(), Qt.DescendingOrder)
+
+
+class UserLazyTableShow(UserTableShow):
+    LIST = QLazyResultTable
+
+    def order(self):
+        return User.nome
+
+    def footer(self):
+        return []
+
+
+class LazyTableTest(unittest.TestCase):
+    def setUp(self):
+        User.delete().execute()
+        self.users = [
+            user_factory(username=str(i), nome=nome) for i, nome
+            in enumerate(['Ana', 'Bia', 'Caio', 'Davi', 'Edu'])]
+        self.show = UserLazyTableShow()
+        self.lista = self.show.instancia_lista
+        self.modelo = self.lista.modelo
+
+    def nomes(self):
+        return [self.modelo.data(self.modelo.index(i, 0))
+                for i in range(self.modelo.rowCount())]
+
+    def cursor(self):
+        return self.modelo._QResultTableModel__cursor
+
+    def test_busca_sob_demanda(self):
+        self.modelo.FETCH_SIZE = 2
+        self.lista.update_result_set()
+        self.assertEqual(self.nomes(), ['Ana', 'Bia'])
+        self.assertTrue(self.modelo.canFetchMore())
+        self.modelo.fetchMore()
+        self.assertEqual(self.modelo.rowCount(), 4)
+        self.modelo.fetchMore()
+        self.assertEqual(self.nomes()[4:], ['Edu'])
+        self.assertFalse(self.modelo.canFetchMore())
+        self.assertIsNone(self.cursor().gi_frame)
+
+    def test_atualiza_linha_na_ordem(self):
+        User.update(nome='Beto').where(
+            User.id == self.users[4].id).execute()
+        self.lista.atualiza_linha(self.users[4].id)
+        self.assertEqual(
+            self.nomes(), ['Ana', 'Beto', 'Bia', 'Caio', 'Davi'])
+        User.delete().where(User.id == self.users[0].id).execute()
+        self.lista.atualiza_linha(self.users[0].id)
+        self.assertEqual(self.nomes(), ['Beto', 'Bia', 'Caio', 'Davi'])
+
+    def test_seleciona_linha(self):
+        self.lista.setCurrentIndex(self.modelo.index(-1, -1))
+        self.assertIsNone(self.lista.selected())
+        self.lista.select_row(2)
+        self.assertEqual(self.lista.selected().nome, 'Caio')
+        self.lista.atualiza_linha(self.users[2].id)
+        self.assertEqual(self.lista.selected().nome, 'Caio')
+
+    def test_fecha_cursor_ao_recarregar(self):
+        self.modelo.FETCH_SIZE = 2
+        self.lista.update_result_set()
+        cursor = self.cursor()
+        self.assertIsNotNone(cursor.gi_frame)
+        self.lista.update_result_set()
+        self.assertIsNone(cursor.gi_frame)
+
+    def test_fecha_cursor_ao_destruir(self):
+        self.modelo.FETCH_SIZE = 2
+        self.lista.update_result_set()
+        cursor = self.cursor()
+        sip.delete(self.show)
+        self.assertIsNone(cursor.gi_frame)
+
+
+class UserLazyListShow(UserListShow):
+    LIST = QLazyResultList
+
+    def get_value(self, obj):
+        return obj.nome
+
+
+class LazyListTest(unittest.TestCase):
+    def setUp(self):
+        User.delete().execute()
+        self.users = [
+            user_factory(username=str(i), nome=nome) for i, nome
+            in enumerate(['Ana', 'Bia', 'Caio', 'Davi', 'Edu'])]
+        self.show = UserLazyListShow()
+        self.lista = self.show.instancia_lista
+        self.modelo = self.lista.modelo
+
+    def nomes(self):
+        return [self.modelo.data(self.modelo.index(i, 0))
+                for i in range(self.modelo.rowCount())]
+
+    def test_busca_sob_demanda(self):
+        self.modelo.FETCH_SIZE = 2
+        self.lista.update_result_set()
+        self.assertEqual(self.nomes(), ['Ana', 'Bia'])
+        self.assertTrue(self.lista.has_more())
+        while self.modelo.canFetchMore():
+            self.modelo.fetchMore()
+        self.assertEqual(self.nomes(), ['Ana', 'Bia', 'Caio', 'Davi', 'Edu'])
+        self.assertFalse(self.lista.has_more())
+
+    def test_selecionado(self):
+        self.assertIsNone(self.lista.selected())
+        self.lista.select_row(3)
+        self.assertEqual(self.lista.selected().nome, 'Davi')
+
+    def test_atualiza_linha_apos_salvar(self):
+        self.lista.select_row(0)
+        widget = QFormWidget(self.users[0].id, formulario=FormularioPessoa)
+        widget.salvo.connect(self.lista.atualiza_linha)
+        widget.instancia_formulario.nome.set_valor('Caua')
+        widget.accept()
+        self.assertEqual(
+            self.nomes(), ['Bia', 'Caio', 'Caua', 'Davi', 'Edu'])
+        self.assertEqual(self.lista.selected().nome, 'Caua')
+
+
+class PrefetchRelatedTest(unittest.TestCase):
+    def setUp(self):
+        Perfil.delete().execute()
+        User.delete().execute()
+        self.users = [user_factory(username=str(i)) for i in range(5)]
+        for user in self.users + [None]:
+            Perfil.create(user=user)
+        self.perfis = list(Perfil.select().order_by(Perfil.id))
+
+    def tearDown(self):
+        identity_map.disable()
+
+    def consultas(self, *args, **kwargs):
+        registro = ConsultasRegistradas()
+        logger = logging.getLogger('peewee')
+        nivel = logger.level
+        logger.addHandler(registro)
+        logger.setLevel(logging.DEBUG)
+        try:
+            prefetch_related(*args, **kwargs)
+        finally:
+            logger.removeHandler(registro)
+            logger.setLevel(nivel)
+        return registro.consultas
+
+    def test_consulta_em_lotes(self):
+        consultas = self.consultas(self.perfis, Perfil.user, batch_size=2)
+        self.assertEqual(len(consultas), 3)
+        self.assertTrue(all(' IN ' in c for c in consultas))
+        self.assertEqual(
+            [p.user.id for p in self.perfis[:5]],
+            [u.id for u in self.users])
+
+    def test_chave_nula(self):
+        self.assertEqual(self.consultas(self.perfis[5:], Perfil.user), [])
+        self.assertNotIn('user', self.perfis[5].__rel__)
+        self.assertIsNone(self.perfis[5].user)
+
+    def test_usa_mapa_de_identidade(self):
+        identity_map.enable()
+        cache = identity_map.get_by_id(User, self.users[0].id)
+        consultas = self.consultas(self.perfis, Perfil.user)
+        self.assertEqual(len(consultas), 1)
+        self.assertIs(self.perfis[0].user, cache)
+        self.assertIs(
+            identity_map.get(User, self.users[1].id), self.perfis[1].user)
+
+    def test_preserva_relacao_carregada(self):
+        carregado = User.get_by_id(self.users[0].id)
+        self.perfis[0].__rel__['user'] = carregado
+        consultas = self.consultas(self.perfis[:1], Perfil.user)
+        self.assertEqual(consultas, [])
+        self.assertIs(self.perfis[0].user, carregado)
+
+
+class UserSemRodapeShow(UserTableShow):
+    def footer(self):
+        return []
+
+
+class ResultTableTest(unittest.TestCase):
+    def setUp(self):
+        User.delete().execute()
+        for i, nome in enumerate(['Ana', 'Rui', 'Eva']):
+            user_factory(username=str(i), nome=nome)
+        self.show = UserSemRodapeShow()
+        self.lista = self.show.instancia_lista
+        self.espera()
+
+    def espera(self):
+        while self.lista.is_busy():
+            app.processEvents()
+
+    def test_uma_consulta_por_atualizacao(self):
+        registro = ConsultasRegistradas()
+        logger = logging.getLogger('peewee')
+        nivel = logger.level
+        logger.addHandler(registro)
+        logger.setLevel(logging.DEBUG)
+        try:
+            self.lista.update_result_set()
+            self.espera()
+        finally:
+            logger.removeHandler(registro)
+            logger.setLevel(nivel)
+        self.assertEqual(len(registro.consultas), 1)
+        self.assertEqual(self.lista.rowCount(), 3)
+
+    def test_selecao_vazia(self):
+        self.lista.setCurrentCell(-1, -1)
+        self.assertIsNone(self.lista.selected())
+        self.lista.select_row(2)
+        self.assertEqual(self.lista.selected().nome, 'Eva')
+        self.lista.values = []
+        self.assertIsNone(self.lista.selected())
+
+
 unittest.main(argv=sys.argv)